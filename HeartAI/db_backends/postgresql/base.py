@@ -0,0 +1,84 @@
+import time
+
+from django.core.signals import request_finished
+from django.db import connections
+from django.db.backends.postgresql.base import DatabaseWrapper as PostgresDatabaseWrapper
+
+from HeartAI.metrics import Counter,Gauge,Histogram
+
+
+# Connection metrics are per worker process. `mode` is 'pool' when
+# OPTIONS['pool'] is configured, 'direct' otherwise.
+connection_acquire_duration = Histogram(
+    'heartai_db_connection_acquire_seconds',
+    'Time to get a database connection: pool wait, or connect time without a pool.',
+    ['alias', 'mode']
+)
+connection_checkout_duration = Histogram(
+    'heartai_db_connection_checkout_seconds',
+    'Time from the first query of a request to the end of the request or the connection closing.',
+    ['alias', 'mode']
+)
+connection_acquire_errors = Counter(
+    'heartai_db_connection_acquire_errors_total',
+    'Failed attempts to get a database connection.',
+    ['alias', 'mode']
+)
+connections_in_use = Gauge(
+    'heartai_db_connections_in_use',
+    'Database connections currently held by this worker.',
+    ['alias', 'mode']
+)
+
+
+class DatabaseWrapper(PostgresDatabaseWrapper):
+    # Persistent connections outlive requests, so checkout time is measured
+    # per request: from the first query until request_finished, or until
+    # the connection is closed if that comes first.
+    _checked_out_at = None
+
+    def _pool_mode(self):
+        return 'pool' if self.pool else 'direct'
+
+    def get_new_connection(self, conn_params):
+        mode = self._pool_mode()
+        started = time.perf_counter()
+        try:
+            connection = super().get_new_connection(conn_params)
+        except Exception:
+            connection_acquire_errors.inc(alias=self.alias, mode=mode)
+            raise
+        finally:
+            connection_acquire_duration.observe(time.perf_counter() - started, alias=self.alias, mode=mode)
+
+        connections_in_use.inc(alias=self.alias, mode=mode)
+        return connection
+
+    def ensure_connection(self):
+        super().ensure_connection()
+        if self._checked_out_at is None:
+            self._checked_out_at = time.perf_counter()
+
+    def release_checkout(self):
+        if self._checked_out_at is not None:
+            connection_checkout_duration.observe(
+                time.perf_counter() - self._checked_out_at, alias=self.alias, mode=self._pool_mode()
+            )
+            self._checked_out_at = None
+
+    def _close(self):
+        try:
+            super()._close()
+        finally:
+            self.release_checkout()
+            if self.connection is not None:
+                connections_in_use.dec(alias=self.alias, mode=self._pool_mode())
+
+
+def release_checkouts(**kwargs):
+    for connection in connections.all(initialized_only=True):
+        if isinstance(connection, DatabaseWrapper):
+            connection.release_checkout()
+
+
+request_finished.connect(release_checkouts)
@@ -0,0 +1,172 @@
+import json
+import random
+import re
+import threading
+import time
+from urllib.parse import parse_qs, unquote, urlsplit
+
+import httplib2
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+
+# Local stand-ins for every remote service the API talks to, used by the
+# tests and installed in process by benchmarks.run so both run offline.
+# `latency` (seconds) is slept on every fake call to emulate a round trip.
+
+FIT_POINT_SPACING_MILLIS = 5 * 60 * 1000
+FIT_MAX_POINTS = 288
+
+
+def fit_points(data_source, start_millis, end_millis):
+    # One point every FIT_POINT_SPACING_MILLIS inside the requested window.
+    rng = random.Random(f"{data_source}:{start_millis}")
+    first = start_millis + FIT_POINT_SPACING_MILLIS - start_millis % FIT_POINT_SPACING_MILLIS
+    points = []
+    for millis in range(first, end_millis, FIT_POINT_SPACING_MILLIS)[-FIT_MAX_POINTS:]:
+        if 'step_count' in data_source:
+            value = [{'intVal': rng.randint(0, 200)}]
+        elif 'calories' in data_source:
+            value = [{'fpVal': rng.uniform(0, 20)}]
+        elif 'heart_rate' in data_source:
+            value = [{'fpVal': rng.uniform(55, 110)}]
+        elif 'blood_pressure' in data_source:
+            value = [{'fpVal': rng.uniform(105, 140)}, {'fpVal': rng.uniform(65, 90)}]
+        else:
+            value = [{'fpVal': rng.uniform(0.94, 0.99)}]
+        points.append({
+            'startTimeNanos': str(millis * 1000000),
+            'endTimeNanos': str(millis * 1000000),
+            'value': value,
+        })
+    return points
+
+
+class FakeFitHttp:
+    # Answers the httplib2 requests googleapiclient makes for
+    # users.dataSources.datasets.get and users.dataset.aggregate.
+    dataset_path = re.compile(r'/dataSources/(?P<source>[^/]+)/datasets/(?P<start>\d+)-(?P<end>\d+)')
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        path = urlsplit(uri).path
+        match = self.dataset_path.search(path)
+        if match:
+            data_source = unquote(match['source'])
+            start = int(match['start']) // 1000000
+            end = int(match['end']) // 1000000
+            data = {'point': fit_points(data_source, start, end)}
+        elif path.endswith('/dataset:aggregate'):
+            request = json.loads(body)
+            start, end = int(request['startTimeMillis']), int(request['endTimeMillis'])
+            duration = int(request['bucketByTime']['durationMillis'])
+            data = {'bucket': [
+                {
+                    'startTimeMillis': str(bucket),
+                    'endTimeMillis': str(min(bucket + duration, end)),
+                    'dataset': [
+                        {'point': self.summary(item['dataSourceId'], bucket, min(bucket + duration, end))}
+                        for item in request['aggregateBy']
+                    ]
+                } for bucket in range(start, end, duration)
+            ]}
+        else:
+            return httplib2.Response({'status': 404}), b'{"error": {"code": 404}}'
+
+        return httplib2.Response({'status': 200, 'content-type': 'application/json'}), json.dumps(data).encode()
+
+    def summary(self, data_source, start, end):
+        # Like Google, an empty bucket has no summary point.
+        points = fit_points(data_source, start, end)
+        if not points:
+            return []
+        if 'heart_rate' in data_source:
+            values = [point['value'][0]['fpVal'] for point in points]
+            value = [{'fpVal': sum(values) / len(values)}, {'fpVal': max(values)}, {'fpVal': min(values)}]
+        elif 'step_count' in data_source:
+            value = [{'intVal': sum(point['value'][0]['intVal'] for point in points)}]
+        else:
+            value = [{'fpVal': sum(point['value'][0]['fpVal'] for point in points)}]
+        return [{'startTimeNanos': str(start * 1000000), 'endTimeNanos': str(end * 1000000), 'value': value}]
+
+    def close(self):
+        pass
+
+
+class FakeServiceAdapter(BaseAdapter):
+    # Mounted in front of every requests.Session, so the pooled outbound
+    # session, google-auth token refreshes and the OAuth code exchange all
+    # land here instead of on the network.
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def send(self, request, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+
+        url = urlsplit(request.url)
+        if url.path.endswith('/userinfo'):
+            with self._lock:
+                self._counter += 1
+                number = self._counter
+            status, data = 200, {
+                'email': f'oauth-{number}@bench.heartai.test',
+                'given_name': 'Bench',
+                'family_name': f'User {number}',
+            }
+        elif url.path.endswith('/token'):
+            fields = parse_qs(request.body if isinstance(request.body, str) else (request.body or b'').decode())
+            status, data = 200, {
+                'access_token': f'bench-access-{time.monotonic_ns()}',
+                'refresh_token': fields.get('refresh_token', ['bench-refresh'])[0],
+                'expires_in': 3600,
+                'token_type': 'Bearer',
+            }
+        elif url.path.endswith('/predict'):
+            heartbeat = json.loads(request.body).get('heartbeat', [])
+            mean = sum(heartbeat) / len(heartbeat) if heartbeat else 0
+            status, data = 200, {'prediction': int(mean > 100), 'probability': min(mean / 200, 1.0)}
+        else:
+            status, data = 404, {'error': 'not found'}
+
+        return self.build_response(request, status, data)
+
+    def build_response(self, request, status, data):
+        response = requests.Response()
+        response.status_code = status
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        response._content = json.dumps(data).encode()
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        response.reason = 'OK' if status < 400 else 'Not Found'
+        return response
+
+    def close(self):
+        pass
+
+
+def install(latency=0.0):
+    import googleapiclient.http
+
+    from HeartAI import outbound
+    from UserVitals import google_fit
+
+    fit_http = FakeFitHttp(latency)
+    googleapiclient.http.build_http = lambda: fit_http
+    # Drop transports the process may already have built.
+    google_fit._service = None
+    google_fit._local = threading.local()
+
+    adapter = FakeServiceAdapter(latency)
+    requests.Session.get_adapter = lambda self, url: adapter
+    outbound._session = None
@@ -0,0 +1,86 @@
+import logging
+import time
+
+from django.db import connection
+
+from .metrics import Counter,Histogram
+from .query_budget import get_query_budget
+
+
+logger = logging.getLogger(__name__)
+
+
+request_duration = Histogram(
+    'heartai_http_request_duration_seconds',
+    'Latency of HTTP requests by view.',
+    ['view', 'method']
+)
+responses = Counter(
+    'heartai_http_responses_total',
+    'HTTP responses by view and status code.',
+    ['view', 'method', 'status']
+)
+request_db_queries = Histogram(
+    'heartai_http_request_db_queries',
+    'Database queries issued per HTTP request.',
+    ['view'],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 250)
+)
+request_db_duration = Histogram(
+    'heartai_http_request_db_duration_seconds',
+    'Time spent in database queries per HTTP request.',
+    ['view']
+)
+query_budget_exceeded = Counter(
+    'heartai_query_budget_exceeded_total',
+    'Requests that ran more queries than their view\'s @query_budget.',
+    ['view']
+)
+
+
+class QueryTimer:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - started
+            self.count += 1
+
+
+def view_name(request):
+    # Labels use the URL pattern's view name, never the raw path, so the
+    # number of series stays bounded.
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return 'unresolved'
+    return match.view_name
+
+
+class MetricsMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        timer = QueryTimer()
+        started = time.perf_counter()
+        with connection.execute_wrapper(timer):
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        view = view_name(request)
+        request_duration.observe(elapsed, view=view, method=request.method)
+        responses.inc(view=view, method=request.method, status=response.status_code)
+        request_db_queries.observe(timer.count, view=view)
+        request_db_duration.observe(timer.duration, view=view)
+
+        match = getattr(request, 'resolver_match', None)
+        budget = get_query_budget(match.func) if match is not None else None
+        if budget is not None and timer.count > budget:
+            query_budget_exceeded.inc(view=view)
+            logger.warning("%s ran %d queries, budget is %d", view, timer.count, budget)
+        return response
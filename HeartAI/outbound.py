@@ -0,0 +1,76 @@
+import logging
+import threading
+import time
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from .metrics import Histogram
+
+
+logger = logging.getLogger(__name__)
+
+outbound_request_duration = Histogram(
+    'heartai_outbound_request_duration_seconds',
+    'Latency of outbound HTTP calls by target.',
+    ['target', 'method', 'status']
+)
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def build_session():
+    # Idempotent methods are retried on connection errors and 502/503/504
+    # with exponential backoff; other methods only on connection errors.
+    retry = Retry(
+        total=settings.OUTBOUND_MAX_RETRIES,
+        backoff_factor=settings.OUTBOUND_BACKOFF_FACTOR,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False
+    )
+    # The adapter keeps one keep-alive pool per host.
+    adapter = HTTPAdapter(
+        pool_connections=settings.OUTBOUND_POOL_CONNECTIONS,
+        pool_maxsize=settings.OUTBOUND_POOL_MAXSIZE,
+        max_retries=retry
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_session():
+    # Created lazily so every gunicorn worker builds its own pools after fork.
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                _session = build_session()
+    return _session
+
+
+def request(target, method, url, **kwargs):
+    # `target` names the integration (e.g. 'userinfo', 'prediction') for metrics.
+    kwargs.setdefault('timeout', settings.OUTBOUND_TIMEOUT)
+    status = 'error'
+    started = time.perf_counter()
+    try:
+        response = get_session().request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        outbound_request_duration.observe(elapsed, target=target, method=method, status=status)
+        logger.debug("%s %s %s -> %s in %.1fms", target, method, url, status, elapsed * 1000)
+
+
+def get(target, url, **kwargs):
+    return request(target, 'GET', url, **kwargs)
+
+
+def post(target, url, **kwargs):
+    return request(target, 'POST', url, **kwargs)
@@ -0,0 +1,89 @@
+import json
+from base64 import b64decode, b64encode
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(CursorPagination):
+    # Pages with WHERE <ordering> > <last seen value> on an indexed column, so
+    # every page costs the same however deep the client goes. Cursors are
+    # opaque base64 tokens returned in `next` / `previous`.
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
+class EmailPagination(KeysetPagination):
+    ordering = 'email'
+
+
+class IdPagination(KeysetPagination):
+    ordering = 'id'
+
+
+class RankPagination(KeysetPagination):
+    # Search results, best rank first with id breaking ties. CursorPagination
+    # keys on the first ordering field only, and ranks repeat, so this cursor
+    # carries the (rank, id) of the row to continue from and the next page
+    # is WHERE rank < r OR (rank = r AND id > i).
+    ordering = ('-rank', 'id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+
+        self.base_url = request.build_absolute_uri()
+        self.cursor = self.decode_cursor(request)
+        reverse = False
+        if self.cursor is None:
+            queryset = queryset.order_by('-rank', 'id')
+        else:
+            rank, id, reverse = self.cursor
+            if reverse:
+                queryset = queryset.filter(Q(rank__gt=rank) | Q(rank=rank, id__lt=id)).order_by('rank', '-id')
+            else:
+                queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__gt=id)).order_by('-rank', 'id')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        if reverse:
+            self.page.reverse()
+            self.has_next, self.has_previous = True, has_more
+        else:
+            self.has_next, self.has_previous = has_more, self.cursor is not None
+        return self.page
+
+    def get_next_link(self):
+        if not (self.has_next and self.page):
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not (self.has_previous and self.page):
+            return None
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if encoded is None:
+            return None
+        try:
+            rank, id, reverse = json.loads(b64decode(encoded.encode('ascii')))
+            if not isinstance(rank, (int, float)) or not isinstance(id, int):
+                raise ValueError(encoded)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        return rank, id, bool(reverse)
+
+    def encode_cursor(self, row, reverse):
+        if isinstance(row, dict):
+            position = [row['rank'], row['id'], int(reverse)]
+        else:
+            position = [row.rank, row.id, int(reverse)]
+        encoded = b64encode(json.dumps(position).encode('ascii')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
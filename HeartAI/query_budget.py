@@ -0,0 +1,40 @@
+from django.urls import get_resolver
+
+
+def query_budget(max_queries):
+    # Declares the most database queries one request to the view may run,
+    # middleware and authentication included. Goes above @api_view so the
+    # attribute lands on the callable the URLconf routes to. None marks a
+    # view whose query count deliberately grows with its input.
+    def decorator(view):
+        view.query_budget = max_queries
+        return view
+    return decorator
+
+
+def get_query_budget(view):
+    return getattr(view, 'query_budget', None)
+
+
+def has_query_budget(view):
+    return hasattr(view, 'query_budget')
+
+
+def routed_views(resolver=None):
+    # Yields (view name, view) for every URL pattern, descending into includes.
+    def walk(patterns, namespace=''):
+        for pattern in patterns:
+            if hasattr(pattern, 'url_patterns'):
+                prefix = f'{namespace}{pattern.namespace}:' if pattern.namespace else namespace
+                yield from walk(pattern.url_patterns, prefix)
+            else:
+                yield f'{namespace}{pattern.name or pattern.lookup_str}', pattern.callback
+
+    yield from walk((resolver or get_resolver()).url_patterns)
+
+
+def budgeted_views(resolver=None):
+    # Yields (view name, view, budget) for every routed view declaring a budget.
+    for name, view in routed_views(resolver):
+        if has_query_budget(view):
+            yield name, view, get_query_budget(view)
@@ -13,10 +13,10 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 import environ
-import json
-from django.core.exceptions import ImproperlyConfigured
 import dj_database_url
 from datetime import timedelta
+from importlib.util import find_spec
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -59,7 +59,7 @@ INSTALLED_APPS = [
 
 REST_FRAMEWORK = {
        'DEFAULT_AUTHENTICATION_CLASSES': [
-           'rest_framework_simplejwt.authentication.JWTAuthentication',
+           'Users.authentication.RoleJWTAuthentication',
        ],
    }
 
@@ -71,6 +71,7 @@ SIMPLE_JWT = {
 }
 
 MIDDLEWARE = [
+    'HeartAI.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -103,34 +104,18 @@ WSGI_APPLICATION = 'HeartAI.wsgi.application'
 GOOGLE_CLIENT_ID = env('GOOGLE_CLIENT_ID')
 GOOGLE_CLIENT_SECRET = env('GOOGLE_CLIENT_SECRET')
 
-SECRETS_FILE_PATH = os.path.join(BASE_DIR, 'client_secrets.json')
-
-# Dynamically create the client_secrets.json file ONLY if it doesn't exist
-if not os.path.exists(SECRETS_FILE_PATH):
-    try:
-        # Structure the data as required by the Google client library
-        client_secrets_data = {
-            "web": {
-                "client_id": GOOGLE_CLIENT_ID,
-                "client_secret": GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://accounts.google.com/o/oauth2/token",
-                "redirect_uris": [
-                    'https://heartai-backend-production-09ef.up.railway.app/vitals/callback/', 
-                ]
-            }
-        }
-        
-        # Write the JSON data to the file
-        with open(SECRETS_FILE_PATH, 'w') as f:
-            json.dump(client_secrets_data, f, indent=4)
-            
-    except Exception as e:
-        # Raise an exception if configuration fails
-        raise ImproperlyConfigured(f"Could not create client_secrets.json: {e}") from e
-
-# Set the settings variable to the generated file path
-CLIENT_SECRETS_FILE = SECRETS_FILE_PATH
+# OAuth client config handed to google_auth_oauthlib's Flow.from_client_config.
+GOOGLE_CLIENT_CONFIG = {
+    "web": {
+        "client_id": GOOGLE_CLIENT_ID,
+        "client_secret": GOOGLE_CLIENT_SECRET,
+        "auth_uri": "https://accounts.google.com/o/oauth2/auth",
+        "token_uri": "https://accounts.google.com/o/oauth2/token",
+        "redirect_uris": [
+            'https://heartai-backend-production-09ef.up.railway.app/vitals/callback/', 
+        ]
+    }
+}
 
 GOOGLE_FIT_REDIRECT_URI = 'https://heartai-backend-production-09ef.up.railway.app/vitals/callback/'  
 GOOGLE_FIT_SCOPES = [
@@ -141,13 +126,119 @@ GOOGLE_FIT_SCOPES = [
     'https://www.googleapis.com/auth/fitness.heart_rate.read',
     'openid'
 ]
+
+# 'concurrent' issues the Google Fit data-source reads in parallel on a
+# bounded thread pool, 'sequential' issues them one after another.
+GOOGLE_FIT_FETCH_MODE = env('GOOGLE_FIT_FETCH_MODE', default='concurrent')
+GOOGLE_FIT_FETCH_WORKERS = env.int('GOOGLE_FIT_FETCH_WORKERS', default=16)
+# Only read data newer than each patient's per-source SyncWatermark and
+# keep running totals, instead of re-reading the full 24h window. Either way
+# the dense data types are summed by users.dataset.aggregate.
+GOOGLE_FIT_INCREMENTAL = env.bool('GOOGLE_FIT_INCREMENTAL', default=True)
+
+# Background sync (`manage.py sync_vitals`). fetch_data serves the stored
+# UserVitals row while it is younger than VITALS_MAX_AGE seconds. Clients
+# may pass a larger ?max_age=, but never less than VITALS_MIN_AGE, so they
+# cannot force a Google Fit call on every request.
+VITALS_SYNC_INTERVAL = env.int('VITALS_SYNC_INTERVAL', default=300)
+VITALS_SYNC_WORKERS = env.int('VITALS_SYNC_WORKERS', default=8)
+VITALS_MAX_AGE = env.int('VITALS_MAX_AGE', default=900)
+VITALS_MIN_AGE = env.int('VITALS_MIN_AGE', default=VITALS_MAX_AGE)
+
+# fetch_data keeps each patient's latest vitals in process memory for up to
+# VITALS_CACHE_TTL seconds, and concurrent syncs of one patient share a single
+# Google fetch across worker processes; waiting requests give up after
+# VITALS_SYNC_WAIT_TIMEOUT.
+VITALS_CACHE_TTL = env.int('VITALS_CACHE_TTL', default=30)
+VITALS_CACHE_SIZE = env.int('VITALS_CACHE_SIZE', default=10000)
+VITALS_SYNC_WAIT_TIMEOUT = env.float('VITALS_SYNC_WAIT_TIMEOUT', default=30)
+
+# Google access tokens expiring within GOOGLE_TOKEN_REFRESH_AHEAD seconds
+# are renewed by the refresh_google_tokens worker.
+GOOGLE_TOKEN_REFRESH_AHEAD = env.int('GOOGLE_TOKEN_REFRESH_AHEAD', default=600)
+GOOGLE_TOKEN_REFRESH_INTERVAL = env.int('GOOGLE_TOKEN_REFRESH_INTERVAL', default=60)
+GOOGLE_TOKEN_REFRESH_WORKERS = env.int('GOOGLE_TOKEN_REFRESH_WORKERS', default=4)
+
+# Most assignment requests a doctor can accept or reject in one call to
+# PUT /users/assignment-requests/respond/bulk/.
+ASSIGNMENT_RESPOND_MAX_BATCH = env.int('ASSIGNMENT_RESPOND_MAX_BATCH', default=200)
+
+# Bulk heart rate uploads (POST /vitals/bpm/ingest/).
+BPM_INGEST_MAX_BATCH = env.int('BPM_INGEST_MAX_BATCH', default=20000)
+BPM_INGEST_CHUNK_SIZE = env.int('BPM_INGEST_CHUNK_SIZE', default=1000)
+
+# Rows fetched per server-side cursor round trip by GET /vitals/bpm/export/.
+BPM_EXPORT_CHUNK_SIZE = env.int('BPM_EXPORT_CHUNK_SIZE', default=2000)
+
+# AI prediction. Ai_pred sends at most AI_PRED_MAX_READINGS heart rate
+# readings from the last AI_PRED_WINDOW_HOURS and caches the result until a
+# new reading arrives or AI_PRED_CACHE_TTL seconds pass.
+# AI_PREDICTOR_BACKEND is 'remote' (the prediction service at
+# AI_PREDICTION_URL) or 'local' (NumPy model loaded from
+# AI_PREDICTOR_MODEL_PATH, see UserVitals/hrv.py).
+AI_PREDICTOR_BACKEND = env('AI_PREDICTOR_BACKEND', default='remote')
+AI_PREDICTOR_MODEL_PATH = env('AI_PREDICTOR_MODEL_PATH', default='')
+AI_PREDICTION_URL = env('AI_PREDICTION_URL', default='https://sharafo-InnovatorsHeartAI.hf.space/predict')
+AI_PREDICTION_TIMEOUT = env.float('AI_PREDICTION_TIMEOUT', default=10)
+AI_PRED_MAX_READINGS = env.int('AI_PRED_MAX_READINGS', default=500)
+AI_PRED_WINDOW_HOURS = env.int('AI_PRED_WINDOW_HOURS', default=168)
+AI_PRED_CACHE_TTL = env.int('AI_PRED_CACHE_TTL', default=600)
+
+# Outbound HTTP (HeartAI/outbound.py): shared keep-alive pools per host,
+# bounded retries with exponential backoff and a default timeout in seconds.
+OUTBOUND_TIMEOUT = env.float('OUTBOUND_TIMEOUT', default=10)
+OUTBOUND_MAX_RETRIES = env.int('OUTBOUND_MAX_RETRIES', default=2)
+OUTBOUND_BACKOFF_FACTOR = env.float('OUTBOUND_BACKOFF_FACTOR', default=0.2)
+OUTBOUND_POOL_CONNECTIONS = env.int('OUTBOUND_POOL_CONNECTIONS', default=10)
+OUTBOUND_POOL_MAXSIZE = env.int('OUTBOUND_POOL_MAXSIZE', default=10)
+
+# Doctor/Patient rows behind JWT-authenticated requests are cached per
+# process for this many seconds; saves and deletes evict them immediately.
+AUTH_USER_CACHE_TTL = env.int('AUTH_USER_CACHE_TTL', default=60)
+AUTH_USER_CACHE_SIZE = env.int('AUTH_USER_CACHE_SIZE', default=10000)
+
+# Video catalog cache. Responses carry ETags and are cached in process
+# until a Videos row changes or the TTL runs out.
+VIDEO_CATALOG_CACHE_TTL = env.int('VIDEO_CATALOG_CACHE_TTL', default=300)
+VIDEO_CATALOG_CACHE_SIZE = env.int('VIDEO_CATALOG_CACHE_SIZE', default=1024)
+VIDEO_CATALOG_MAX_AGE = env.int('VIDEO_CATALOG_MAX_AGE', default=60)
+
+# Bearer token required by GET /metrics/ (Prometheus text format).
+METRICS_TOKEN = env('METRICS_TOKEN', default='')
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Connections are kept open for DB_CONN_MAX_AGE seconds and health-checked
+# before reuse. DB_POOL switches to a psycopg connection pool per worker
+# instead, sized by DB_POOL_MIN_SIZE/MAX_SIZE; DB_POOL_TIMEOUT is how long a
+# request waits for a free connection. The pool needs psycopg 3 and
+# psycopg-pool, which requirements.txt does not install (it pins psycopg2).
+DB_POOL = env.bool('DB_POOL', default=False)
+if DB_POOL and not (find_spec('psycopg') and find_spec('psycopg_pool')):
+    raise ImproperlyConfigured(
+        "DB_POOL needs psycopg 3 with its pool: pip install 'psycopg[binary,pool]'"
+    )
+
 DATABASES = {
-    "default": dj_database_url.config(default=env("DATABASE_URL"))
+    "default": dj_database_url.config(
+        default=env("DATABASE_URL"),
+        conn_max_age=0 if DB_POOL else env.int('DB_CONN_MAX_AGE', default=600),
+        conn_health_checks=not DB_POOL
+    )
 }
 
+# Postgres goes through a thin wrapper that records connection wait and
+# per-request hold times in HeartAI.metrics.
+if DATABASES["default"]["ENGINE"] == 'django.db.backends.postgresql':
+    DATABASES["default"]["ENGINE"] = 'HeartAI.db_backends.postgresql'
+    if DB_POOL:
+        DATABASES["default"].setdefault("OPTIONS", {})["pool"] = {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': env.int('DB_POOL_MAX_SIZE', default=10),
+            'timeout': env.float('DB_POOL_TIMEOUT', default=10),
+        }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
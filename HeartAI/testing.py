@@ -0,0 +1,46 @@
+from urllib.parse import urlsplit
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve
+
+from Users.authentication import clear_user_cache,tokens_for
+from .query_budget import get_query_budget,has_query_budget
+
+
+class QueryBudgetTestMixin:
+    # Sends a request through the full stack and fails if the view runs more
+    # queries than its @query_budget allows. The authenticated-user cache is
+    # cleared first, so budgets cover a cold worker.
+
+    def request_within_budget(self, method, path, **kwargs):
+        match = resolve(urlsplit(path).path)
+        if not has_query_budget(match.func):
+            self.fail(f"{match.view_name} does not declare a @query_budget")
+        budget = get_query_budget(match.func)
+
+        clear_user_cache()
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(path, **kwargs)
+            if getattr(response, 'streaming', False):
+                b''.join(response.streaming_content)
+
+        if budget is not None and len(queries) > budget:
+            self.fail(
+                f"{match.view_name} ran {len(queries)} queries, budget is {budget}:\n"
+                + '\n'.join(f"  {query['sql']}" for query in queries.captured_queries)
+            )
+        return response
+
+    def auth_headers(self, user):
+        return {'HTTP_AUTHORIZATION': f'Bearer {tokens_for(user).access_token}'}
+
+    def follow_pages(self, path, key, **kwargs):
+        # Follows `next` cursors to the end, each page within budget, and
+        # returns `key` of every row in the order served.
+        values = []
+        while path:
+            page = self.request_within_budget('get', path, **kwargs).json()
+            values += [row[key] for row in page['results']]
+            path = page['next']
+        return values
@@ -0,0 +1,65 @@
+import re
+
+from django.test import TestCase
+
+from youtube_videos.models import Videos
+
+
+SAMPLE = re.compile(r'^(?P<name>[a-z_]+)(?:\{(?P<labels>.*)\})? (?P<value>\S+)$')
+
+
+def parse_samples(text):
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith('#'):
+            continue
+        match = SAMPLE.match(line)
+        samples[(match['name'], match['labels'] or '')] = float(match['value'])
+    return samples
+
+
+class MetricsEndpointTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Videos.objects.create(title='Heart health', mini_description='Basics', description='', link='https://example.com')
+
+    def scrape(self, token='secret'):
+        with self.settings(METRICS_TOKEN='secret'):
+            return self.client.get('/metrics/', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+    def test_requires_the_bearer_token(self):
+        with self.settings(METRICS_TOKEN='secret'):
+            self.assertEqual(self.client.get('/metrics/').status_code, 401)
+        self.assertEqual(self.scrape(token='wrong').status_code, 401)
+        self.assertEqual(self.scrape().status_code, 200)
+
+    def test_hidden_without_a_token_unless_debugging(self):
+        with self.settings(METRICS_TOKEN='', DEBUG=False):
+            self.assertEqual(self.client.get('/metrics/').status_code, 404)
+        with self.settings(METRICS_TOKEN='', DEBUG=True):
+            self.assertEqual(self.client.get('/metrics/').status_code, 200)
+
+    def test_records_requests(self):
+        before = parse_samples(self.scrape().content.decode())
+        self.client.get('/videos/video_list')
+        response = self.scrape()
+
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        text = response.content.decode()
+        self.assertIn('# TYPE heartai_http_responses_total counter', text)
+        self.assertIn('# TYPE heartai_http_request_duration_seconds histogram', text)
+        after = parse_samples(text)
+
+        def added(name, labels):
+            return after[(name, labels)] - before.get((name, labels), 0)
+
+        self.assertEqual(added('heartai_http_responses_total', 'view="get_videos",method="GET",status="200"'), 1)
+        duration = 'heartai_http_request_duration_seconds'
+        labels = 'view="get_videos",method="GET"'
+        self.assertEqual(added(f'{duration}_count', labels), 1)
+        self.assertEqual(added(f'{duration}_bucket', f'{labels},le="+Inf"'), 1)
+        self.assertGreater(added(f'{duration}_sum', labels), 0)
+        # Buckets are cumulative.
+        buckets = [value for (name, label_text), value in after.items()
+                   if name == f'{duration}_bucket' and label_text.startswith(labels)]
+        self.assertEqual(buckets, sorted(buckets))
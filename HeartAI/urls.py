@@ -1,9 +1,12 @@
 from django.contrib import admin
 from django.urls import path,include
 
+from .views import metrics
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('users/',include('Users.urls')),
     path('vitals/',include('UserVitals.urls')),
-    path('videos/',include('youtube_videos.urls'))
+    path('videos/',include('youtube_videos.urls')),
+    path('metrics/', metrics, name='metrics')
 ]
@@ -0,0 +1,20 @@
+import hmac
+
+from django.conf import settings
+from django.http import Http404,HttpResponse
+
+from .metrics import render
+
+
+def metrics(request):
+    # Metrics are per worker process. When METRICS_TOKEN is set, scrapers
+    # send it as a bearer token; without one the endpoint is only served
+    # with DEBUG on.
+    if settings.METRICS_TOKEN:
+        expected = f'Bearer {settings.METRICS_TOKEN}'
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), expected):
+            return HttpResponse(status=401)
+    elif not settings.DEBUG:
+        raise Http404
+
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
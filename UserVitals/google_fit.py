@@ -0,0 +1,295 @@
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from googleapiclient.errors import HttpError
+
+from HeartAI import outbound
+
+
+STEP_COUNT_SOURCE = 'derived:com.google.step_count.delta:com.google.android.gms:estimated_steps'
+CALORIES_SOURCE = 'derived:com.google.calories.expended:com.google.android.gms:merge_calories_expended'
+BLOOD_PRESSURE_SOURCE = 'derived:com.google.blood_pressure:com.google.android.gms:merged'
+HEART_RATE_SOURCE = 'derived:com.google.heart_rate.bpm:com.google.android.gms:merge_heart_rate_bpm'
+OXYGEN_SATURATION_SOURCE = 'derived:com.google.oxygen_saturation:com.google.android.gms:merged'
+
+DATA_SOURCES = [
+    STEP_COUNT_SOURCE,
+    CALORIES_SOURCE,
+    BLOOD_PRESSURE_SOURCE,
+    HEART_RATE_SOURCE,
+    OXYGEN_SATURATION_SOURCE,
+]
+
+_executor = None
+_executor_lock = threading.Lock()
+
+_service = None
+_service_lock = threading.Lock()
+
+_local = threading.local()
+
+
+def get_fitness_service():
+    # The Fitness client is built once per process from the discovery
+    # document bundled with google-api-python-client. It carries no
+    # credentials: every request is executed with authorized_http().
+    # The discovery client and httplib2 are imported on first use so web
+    # workers that never call Google Fit do not pay for them at boot.
+    global _service
+    if _service is None:
+        with _service_lock:
+            if _service is None:
+                from googleapiclient.discovery import build_from_document
+                from googleapiclient.discovery_cache import get_static_doc
+                from googleapiclient.http import build_http
+
+                discovery_document = json.loads(get_static_doc('fitness', 'v1'))
+                _service = build_from_document(discovery_document, http=build_http())
+    return _service
+
+
+def authorized_http(credentials):
+    # Wrapping is cheap; the underlying httplib2.Http is kept per thread so
+    # its connections stay alive across requests without being shared
+    # between threads.
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
+
+    http = getattr(_local, 'http', None)
+    if http is None:
+        http = _local.http = build_http()
+    return AuthorizedHttp(credentials, http=http)
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.GOOGLE_FIT_FETCH_WORKERS,
+                    thread_name_prefix='google-fit'
+                )
+    return _executor
+
+
+def execute(request, http=None):
+    # Google Fit goes through httplib2 rather than HeartAI.outbound, so its
+    # calls are timed here into the same outbound latency histogram.
+    status = 'error'
+    started = time.perf_counter()
+    try:
+        response = request.execute(http=http)
+        status = '200'
+        return response
+    except HttpError as e:
+        status = str(e.resp.status)
+        raise
+    finally:
+        outbound.outbound_request_duration.observe(
+            time.perf_counter() - started,
+            target='google_fit',
+            method=request.method,
+            status=status
+        )
+
+
+def fetch_dataset(service, data_source_id, dataset_id, http=None):
+    return execute(service.users().dataSources().datasets().get(
+        userId='me',
+        dataSourceId=data_source_id,
+        datasetId=dataset_id
+    ), http)
+
+
+def _run_in_worker(call, credentials):
+    return call(authorized_http(credentials))
+
+
+def execute_calls(calls, credentials):
+    # `calls` maps a key to a callable taking the authorized http to run on.
+    if settings.GOOGLE_FIT_FETCH_MODE != 'concurrent':
+        http = authorized_http(credentials)
+        return {key: call(http) for key, call in calls.items()}
+
+    # httplib2 connections are not thread safe, so every call builds its
+    # authorized transport inside the worker thread that runs it.
+    executor = get_executor()
+    futures = {
+        key: executor.submit(_run_in_worker, call, credentials)
+        for key, call in calls.items()
+    }
+
+    results = {}
+    errors = []
+    for key, future in futures.items():
+        try:
+            results[key] = future.result()
+        except HttpError as e:
+            errors.append(e)
+
+    if errors:
+        # An expired token fails every read; surface that over other errors
+        # so the caller can still answer 401 instead of 502.
+        for error in errors:
+            if error.resp.status == 401:
+                raise error
+        raise errors[0]
+
+    return results
+
+
+# Sync keeps a running summary per data source (see
+# Users.models.SyncWatermark) and only reads data newer than the watermark.
+# The dense sources are read with one users.dataset.aggregate call bucketed by
+# BUCKET_MILLIS, so Google returns one summary point per source and bucket
+# instead of every raw point. Each bucket is stored as [total, count] so the
+# 24h window can slide without re-reading it; the bucket holding the
+# watermark is re-read and replaced to pick up points that arrived late.
+# The window starts on a bucket boundary, so it spans 24h plus at most one
+# bucket.
+DAY_MILLIS = 24 * 60 * 60 * 1000
+BUCKET_MILLIS = 15 * 60 * 1000
+
+# Field holding the bucket summary. Steps and calories aggregate to a sum;
+# heart rate aggregates to [average, max, min] and is kept as the average of
+# its bucket averages.
+SUMMED_SOURCES = {
+    STEP_COUNT_SOURCE: 'intVal',
+    CALORIES_SOURCE: 'fpVal',
+    HEART_RATE_SOURCE: 'fpVal',
+}
+# Blood pressure and oxygen saturation report the latest reading, which an
+# aggregate cannot give, and are sparse enough to read raw.
+LATEST_SOURCES = [BLOOD_PRESSURE_SOURCE, OXYGEN_SATURATION_SOURCE]
+
+
+def point_millis(point):
+    return int(point.get('startTimeNanos', 0)) // 1000000
+
+
+def bucket_start(millis):
+    return millis - millis % BUCKET_MILLIS
+
+
+def aggregate_buckets(service, data_source_ids, start_millis, end_millis, http=None):
+    return execute(service.users().dataset().aggregate(
+        userId='me',
+        body={
+            'aggregateBy': [
+                {'dataSourceId': data_source_id}
+                for data_source_id in data_source_ids
+            ],
+            'bucketByTime': {'durationMillis': BUCKET_MILLIS},
+            'startTimeMillis': start_millis,
+            'endTimeMillis': end_millis,
+        }
+    ), http)
+
+
+def parse_aggregate_buckets(aggregate_data, data_source_ids):
+    # Returns {data source: {bucket start: [total, count]}}. Datasets come
+    # back in the order they were requested in aggregateBy; empty buckets
+    # have no points.
+    buckets = {data_source_id: {} for data_source_id in data_source_ids}
+    for bucket in aggregate_data.get('bucket', []):
+        key = bucket_start(int(bucket['startTimeMillis']))
+        for data_source_id, dataset in zip(data_source_ids, bucket.get('dataset', [])):
+            field = SUMMED_SOURCES[data_source_id]
+            for point in dataset.get('point', []):
+                value = (point.get('value') or [{}])[0].get(field)
+                if value is not None:
+                    buckets[data_source_id][key] = [value, 1]
+    return buckets
+
+
+def merge_summed(state, fetched, refetch_from, window_start):
+    buckets = {
+        int(key): value
+        for key, value in state.get('buckets', {}).items()
+        if window_start <= int(key) < refetch_from
+    }
+    buckets.update({key: value for key, value in fetched.items() if key >= window_start})
+    return {'buckets': {str(key): value for key, value in buckets.items()}}
+
+
+def merge_latest(state, points, window_start):
+    latest = state.get('latest')
+    if points:
+        point = max(points, key=point_millis)
+        latest = {
+            'at': point_millis(point),
+            'values': [value.get('fpVal') for value in point.get('value', [])],
+        }
+    if latest is not None and latest['at'] < window_start:
+        latest = None
+    return {'latest': latest}
+
+
+def fetch_vitals(service, credentials, watermarks, now):
+    # `watermarks` maps a data source to its (synced_until, state); pass {}
+    # to read the whole window. Returns the vitals for the last 24h and the
+    # new state for every data source.
+    window_start = bucket_start(now - DAY_MILLIS)
+    refetch_from = {}
+    for data_source in DATA_SOURCES:
+        start = window_start
+        if data_source in watermarks:
+            synced_until, _ = watermarks[data_source]
+            start = max(window_start, bucket_start(synced_until))
+        refetch_from[data_source] = start
+
+    # One aggregate covers every summed source from the oldest of their
+    # watermarks.
+    summed_sources = list(SUMMED_SOURCES)
+    aggregate_from = min(refetch_from[data_source] for data_source in summed_sources)
+    for data_source in summed_sources:
+        refetch_from[data_source] = aggregate_from
+
+    calls = {
+        'aggregate': partial(aggregate_buckets, service, summed_sources, aggregate_from, now),
+    }
+    calls.update({
+        data_source: partial(
+            fetch_dataset,
+            service,
+            data_source,
+            f"{refetch_from[data_source] * 1000000}-{now * 1000000}"
+        )
+        for data_source in LATEST_SOURCES
+    })
+    results = execute_calls(calls, credentials)
+    fetched = parse_aggregate_buckets(results['aggregate'], summed_sources)
+
+    states = {}
+    for data_source in DATA_SOURCES:
+        _, state = watermarks.get(data_source, (None, {}))
+        if data_source in SUMMED_SOURCES:
+            states[data_source] = merge_summed(state, fetched[data_source], refetch_from[data_source], window_start)
+        else:
+            states[data_source] = merge_latest(state, results[data_source].get('point', []), window_start)
+
+    def totals(data_source):
+        buckets = states[data_source]['buckets'].values()
+        return sum(total for total, _ in buckets), sum(count for _, count in buckets)
+
+    steps, _ = totals(STEP_COUNT_SOURCE)
+    calories, _ = totals(CALORIES_SOURCE)
+    heart_rate_total, heart_rate_count = totals(HEART_RATE_SOURCE)
+
+    blood_pressure = states[BLOOD_PRESSURE_SOURCE]['latest']
+    oxygen_saturation = states[OXYGEN_SATURATION_SOURCE]['latest']
+
+    vitals = {
+        'steps': int(steps),
+        'calories': float(calories),
+        'systolic_blood_pressure': blood_pressure['values'][0] if blood_pressure else None,
+        'diastolic_blood_pressure': blood_pressure['values'][1] if blood_pressure else None,
+        'heart_rate': heart_rate_total / heart_rate_count if heart_rate_count else None,
+        'oxygen_sat': oxygen_saturation['values'][0] if oxygen_saturation and oxygen_saturation['values'] else None,
+    }
+    return vitals, states
@@ -0,0 +1,123 @@
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+from HeartAI import outbound
+from Users.models import UserCredentials
+
+
+logger = logging.getLogger(__name__)
+
+
+def build_credentials(user_credentials):
+    # google-auth is imported on first use to keep it out of worker boot.
+    from google.oauth2.credentials import Credentials
+
+    # google-auth compares expiry against a naive UTC datetime.
+    expiry = user_credentials.expires_at
+    if expiry is not None and timezone.is_aware(expiry):
+        expiry = expiry.astimezone(dt_timezone.utc).replace(tzinfo=None)
+
+    return Credentials(
+        token=user_credentials.access_token,
+        refresh_token=user_credentials.refresh_token,
+        token_uri=user_credentials.token_uri,
+        client_id=user_credentials.client_id,
+        client_secret=user_credentials.client_secret,
+        scopes=user_credentials.scopes,
+        expiry=expiry
+    )
+
+
+def needs_refresh(user_credentials, ahead=None):
+    if ahead is None:
+        ahead = settings.GOOGLE_TOKEN_REFRESH_AHEAD
+    expires_at = user_credentials.expires_at
+    return expires_at is None or expires_at <= timezone.now() + timedelta(seconds=ahead)
+
+
+def save_credentials(user_credentials, credentials):
+    # Writes a token google-auth obtained back to the row, so the refresh is
+    # paid once rather than on every later request.
+    if credentials.token == user_credentials.access_token:
+        return False
+
+    user_credentials.access_token = credentials.token
+    if credentials.expiry is not None:
+        user_credentials.expires_at = credentials.expiry.replace(tzinfo=dt_timezone.utc)
+    if credentials.refresh_token:
+        user_credentials.refresh_token = credentials.refresh_token
+
+    UserCredentials.objects.filter(pk = user_credentials.pk).update(
+        access_token = user_credentials.access_token,
+        expires_at = user_credentials.expires_at,
+        refresh_token = user_credentials.refresh_token
+    )
+    return True
+
+
+def refresh_credentials(user_credentials):
+    from google.auth.transport.requests import Request
+
+    credentials = build_credentials(user_credentials)
+    # Token exchanges go through the shared keep-alive session.
+    credentials.refresh(Request(session=outbound.get_session()))
+    save_credentials(user_credentials, credentials)
+    return credentials
+
+
+def fresh_credentials(user_credentials):
+    # Refresh before any Google Fit call is made: the concurrent fetch path
+    # shares one Credentials object between threads, and each would
+    # otherwise refresh it on its own.
+    if user_credentials.refresh_token and needs_refresh(user_credentials, ahead=0):
+        return refresh_credentials(user_credentials)
+    return build_credentials(user_credentials)
+
+
+def refresh_expiring(executor, ahead=None):
+    if ahead is None:
+        ahead = settings.GOOGLE_TOKEN_REFRESH_AHEAD
+    expiring = UserCredentials.objects.filter(
+        refresh_token__isnull = False,
+        expires_at__lte = timezone.now() + timedelta(seconds=ahead)
+    ).exclude(refresh_token = '')
+    results = list(executor.map(_refresh_in_worker, expiring))
+    return results.count(True), results.count(False)
+
+
+def _refresh_in_worker(user_credentials):
+    from google.auth.exceptions import RefreshError
+
+    close_old_connections()
+    try:
+        refresh_credentials(user_credentials)
+        return True
+    except RefreshError:
+        # Revoked or expired grants need the patient to reconnect Google Fit.
+        logger.warning("Google token refresh rejected for patient %s", user_credentials.patient_id)
+        return False
+    except Exception:
+        logger.exception("Google token refresh failed for patient %s", user_credentials.patient_id)
+        return False
+    finally:
+        close_old_connections()
+
+
+def run_refresher(interval, workers, once=False):
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='google-tokens') as executor:
+        while True:
+            started = time.monotonic()
+            refreshed, failed = refresh_expiring(executor)
+            elapsed = time.monotonic() - started
+            logger.info(
+                "Refreshed %d Google tokens (%d failed) in %.1fs",
+                refreshed, failed, elapsed
+            )
+            if once:
+                return refreshed, failed
+            time.sleep(max(interval - elapsed, 0))
@@ -0,0 +1,99 @@
+import numpy as np
+
+
+# Local model files are .npz archives written by save_model():
+#   weights  (n_features,) logistic regression coefficients
+#   bias     ()            intercept
+#   mean     (n_features,) feature means used for standardisation
+#   scale    (n_features,) feature standard deviations
+#   threshold ()           probability above which the prediction is 1
+FEATURE_NAMES = [
+    'mean_bpm',
+    'std_bpm',
+    'min_bpm',
+    'max_bpm',
+    'sdnn',
+    'rmssd',
+    'pnn50',
+    'rolling_mean_last',
+    'rolling_mean_min',
+    'rolling_mean_max',
+    'trend',
+]
+
+ROLLING_WINDOW = 5
+
+
+def extract_features(heartbeat):
+    bpm = np.asarray(heartbeat, dtype=np.float64)
+    bpm = bpm[np.isfinite(bpm) & (bpm > 0)]
+    if bpm.size == 0:
+        raise ValueError("No usable heart rate readings")
+
+    # Beat-to-beat intervals in milliseconds, derived from the BPM series.
+    rr = 60000.0 / bpm
+    rr_diff = np.diff(rr)
+
+    window = min(ROLLING_WINDOW, bpm.size)
+    rolling_mean = np.convolve(bpm, np.ones(window) / window, mode='valid')
+
+    trend = 0.0
+    if bpm.size > 1:
+        trend = np.polyfit(np.arange(bpm.size), bpm, 1)[0]
+
+    return np.array([
+        bpm.mean(),
+        bpm.std(),
+        bpm.min(),
+        bpm.max(),
+        rr.std(ddof=1) if rr.size > 1 else 0.0,
+        np.sqrt(np.mean(rr_diff ** 2)) if rr_diff.size else 0.0,
+        np.mean(np.abs(rr_diff) > 50.0) if rr_diff.size else 0.0,
+        rolling_mean[-1],
+        rolling_mean.min(),
+        rolling_mean.max(),
+        trend,
+    ])
+
+
+class LogisticModel:
+    def __init__(self, weights, bias, mean, scale, threshold=0.5):
+        self.weights = np.asarray(weights, dtype=np.float64)
+        self.bias = float(bias)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.where(np.asarray(scale, dtype=np.float64) == 0, 1.0, scale)
+        self.threshold = float(threshold)
+
+        if not self.weights.shape == self.mean.shape == self.scale.shape == (len(FEATURE_NAMES),):
+            raise ValueError(f"Model must have {len(FEATURE_NAMES)} weights, means and scales")
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as archive:
+            return cls(
+                archive['weights'],
+                archive['bias'],
+                archive['mean'],
+                archive['scale'],
+                archive['threshold'] if 'threshold' in archive else 0.5
+            )
+
+    def save(self, path):
+        np.savez(
+            path,
+            weights=self.weights,
+            bias=self.bias,
+            mean=self.mean,
+            scale=self.scale,
+            threshold=self.threshold
+        )
+
+    def predict(self, heartbeat):
+        features = extract_features(heartbeat)
+        score = np.dot(self.weights, (features - self.mean) / self.scale) + self.bias
+        probability = float(1.0 / (1.0 + np.exp(-score)))
+        return {
+            'prediction': int(probability >= self.threshold),
+            'probability': probability,
+            'features': dict(zip(FEATURE_NAMES, features.round(4).tolist())),
+        }
@@ -0,0 +1,118 @@
+import warnings
+from datetime import datetime, timezone as dt_timezone
+
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from .rollups import record_bpm
+
+
+MIN_HEART_RATE = 20.0
+MAX_HEART_RATE = 300.0
+# Readings may be stamped slightly ahead of the server clock.
+MAX_CLOCK_SKEW_MILLIS = 5 * 60 * 1000
+
+
+def raw_values(readings, key):
+    return np.fromiter(
+        (reading.get(key) if isinstance(reading, dict) else None for reading in readings),
+        dtype=object,
+        count=len(readings)
+    )
+
+
+def numbers(values):
+    # Ints and floats as float64, anything else (bools included) as NaN.
+    kinds = np.fromiter(map(type, values), dtype=object, count=len(values))
+    numeric = (kinds == int) | (kinds == float)
+    result = np.full(len(values), np.nan)
+    try:
+        result[numeric] = values[numeric].astype(np.float64)
+    except OverflowError:
+        # An int past the float64 range fails the whole cast; convert one by one instead.
+        result[numeric] = [number_value(value) for value in values[numeric]]
+    return result, kinds
+
+
+def number_value(value):
+    try:
+        return float(value)
+    except OverflowError:
+        return np.nan
+
+
+def timestamp_millis(values):
+    # Epoch milliseconds or ISO 8601 strings, which are UTC unless they carry
+    # an offset. Anything else becomes NaN.
+    millis, kinds = numbers(values)
+    strings = kinds == str
+    if strings.any():
+        parsed = parse_iso(values[strings])
+        millis[strings] = np.where(np.isnat(parsed), np.nan, parsed.astype(np.int64))
+    return millis
+
+
+def parse_iso(values):
+    # NumPy converts offsets to UTC but warns that datetime64 has no zone.
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', UserWarning)
+        try:
+            return values.astype('datetime64[ms]')
+        except ValueError:
+            # One bad string fails the whole cast; parse one by one instead.
+            return np.array([parse_iso_value(value) for value in values], dtype='datetime64[ms]')
+
+
+def parse_iso_value(value):
+    try:
+        return np.datetime64(value, 'ms')
+    except ValueError:
+        return np.datetime64('NaT', 'ms')
+
+
+def ingest_readings(patient, readings):
+    # `readings` is a list of {"timestamp": <epoch ms or ISO 8601>,
+    # "heart_rate": <bpm>} objects. Invalid readings are skipped and reported
+    # by index, duplicates by (patient, timestamp) are dropped.
+    timestamps = timestamp_millis(raw_values(readings, 'timestamp'))
+    heart_rates, _ = numbers(raw_values(readings, 'heart_rate'))
+
+    # Validate the whole batch at once.
+    now = timezone.now().timestamp() * 1000
+    valid = (
+        np.isfinite(timestamps)
+        & np.isfinite(heart_rates)
+        & (timestamps > 0)
+        & (timestamps <= now + MAX_CLOCK_SKEW_MILLIS)
+        & (heart_rates >= MIN_HEART_RATE)
+        & (heart_rates <= MAX_HEART_RATE)
+    )
+    rejected = np.flatnonzero(~valid)
+
+    # Postgres stores microseconds; the API works in whole milliseconds.
+    timestamps = np.round(timestamps[valid]).astype(np.int64)
+    heart_rates = heart_rates[valid]
+
+    # Keep the last reading for a timestamp repeated within the batch.
+    reversed_unique, reversed_index = np.unique(timestamps[::-1], return_index=True)
+    keep = len(timestamps) - 1 - reversed_index
+    timestamps = reversed_unique
+    heart_rates = heart_rates[keep]
+
+    inserted = record_bpm(
+        patient,
+        zip(map(to_datetime, timestamps.tolist()), heart_rates.tolist()),
+        batch_size=settings.BPM_INGEST_CHUNK_SIZE
+    )
+
+    return {
+        'received': len(readings),
+        'inserted': len(inserted),
+        'duplicates': int(valid.sum()) - len(inserted),
+        'rejected': rejected.tolist(),
+    }
+
+
+def to_datetime(millis):
+    return datetime.fromtimestamp(int(millis) / 1000, tz=dt_timezone.utc)
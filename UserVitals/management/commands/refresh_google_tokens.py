@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from UserVitals.google_tokens import run_refresher
+
+
+class Command(BaseCommand):
+    help = "Periodically refresh Google access tokens that are about to expire."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.GOOGLE_TOKEN_REFRESH_INTERVAL,
+            help="Seconds between the start of two refresh cycles."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.GOOGLE_TOKEN_REFRESH_WORKERS,
+            help="Tokens refreshed in parallel."
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run a single refresh cycle and exit."
+        )
+
+    def handle(self, *args, **options):
+        refreshed, failed = run_refresher(
+            interval=options['interval'],
+            workers=options['workers'],
+            once=options['once']
+        )
+        self.stdout.write(f"Refreshed {refreshed} Google tokens ({failed} failed)")
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from UserVitals.sync import run_worker
+
+
+class Command(BaseCommand):
+    help = "Periodically sync Google Fit vitals for every patient with stored credentials."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.VITALS_SYNC_INTERVAL,
+            help="Seconds between the start of two sync cycles."
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.VITALS_SYNC_WORKERS,
+            help="Patients synced in parallel by this process."
+        )
+        parser.add_argument(
+            '--shard',
+            type=int,
+            default=0,
+            help="Index of the patient shard handled by this process."
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=1,
+            help="Total number of worker processes sharing the patients."
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help="Run a single sync cycle and exit."
+        )
+
+    def handle(self, *args, **options):
+        if not 0 <= options['shard'] < options['shards']:
+            raise CommandError("--shard must be between 0 and --shards - 1")
+
+        synced, failed = run_worker(
+            interval=options['interval'],
+            workers=options['workers'],
+            shard=options['shard'],
+            shards=options['shards'],
+            once=options['once']
+        )
+        self.stdout.write(f"Synced vitals for {synced} patients ({failed} failed)")
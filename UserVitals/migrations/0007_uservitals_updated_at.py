@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserVitals', '0006_delete_usercredentials'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uservitals',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, null=True),
+        ),
+    ]
@@ -0,0 +1,148 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:09
+
+from datetime import timedelta
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+
+
+# UserBPM rows written before recorded_at existed all get the same
+# timestamp when the column is added. Their real times were never stored;
+# they were written about one per sync, so they are spread back from it
+# LEGACY_READING_SPACING apart, newest id first.
+LEGACY_READING_SPACING = timedelta(minutes=5)
+
+
+def spread_legacy_readings(apps, schema_editor):
+    UserBPM = apps.get_model('UserVitals', 'UserBPM')
+    groups = list(
+        UserBPM.objects.values('patient_id', 'recorded_at').annotate(rows=Count('id')).filter(rows__gt=1).order_by()
+    )
+    taken = {}
+    for group in groups:
+        patient_id = group['patient_id']
+        if patient_id not in taken:
+            taken[patient_id] = set(
+                UserBPM.objects.filter(patient_id=patient_id).values_list('recorded_at', flat=True)
+            )
+        rows = list(UserBPM.objects.filter(
+            patient_id=patient_id, recorded_at=group['recorded_at']
+        ).order_by('-id').only('id', 'recorded_at'))[1:]
+
+        recorded_at = group['recorded_at']
+        for row in rows:
+            recorded_at -= LEGACY_READING_SPACING
+            while recorded_at in taken[patient_id]:
+                recorded_at -= LEGACY_READING_SPACING
+            row.recorded_at = recorded_at
+            taken[patient_id].add(recorded_at)
+        UserBPM.objects.bulk_update(rows, ['recorded_at'], batch_size=1000)
+
+
+def backfill_rollups(apps, schema_editor):
+    UserBPM = apps.get_model('UserVitals', 'UserBPM')
+    for model_name, kind in [('UserBPMMinute', 'minute'), ('UserBPMHour', 'hour'), ('UserBPMDay', 'day')]:
+        model = apps.get_model('UserVitals', model_name)
+        rows = UserBPM.objects.filter(heart_rate__isnull=False).values(
+            'patient_id', bucket=Trunc('recorded_at', kind)
+        ).annotate(
+            count=Count('id'),
+            total=Sum('heart_rate'),
+            minimum=Min('heart_rate'),
+            maximum=Max('heart_rate')
+        ).order_by()
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserVitals', '0007_uservitals_updated_at'),
+        ('Users', '0013_syncwatermark'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserBPMDay',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserBPMHour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.CreateModel(
+            name='UserBPMMinute',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('count', models.IntegerField(default=0)),
+                ('total', models.FloatField(default=0.0)),
+                ('minimum', models.FloatField(blank=True, null=True)),
+                ('maximum', models.FloatField(blank=True, null=True)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AddField(
+            model_name='userbpm',
+            name='recorded_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(spread_legacy_readings, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='userbpm',
+            index=models.Index(fields=['patient', 'recorded_at'], name='userbpm_patient_recorded_idx'),
+        ),
+        migrations.AddField(
+            model_name='userbpmday',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Users.patient'),
+        ),
+        migrations.AddField(
+            model_name='userbpmhour',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Users.patient'),
+        ),
+        migrations.AddField(
+            model_name='userbpmminute',
+            name='patient',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Users.patient'),
+        ),
+        migrations.AddConstraint(
+            model_name='userbpmday',
+            constraint=models.UniqueConstraint(fields=('patient', 'bucket'), name='userbpmday_unique_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='userbpmhour',
+            constraint=models.UniqueConstraint(fields=('patient', 'bucket'), name='userbpmhour_unique_bucket'),
+        ),
+        migrations.AddConstraint(
+            model_name='userbpmminute',
+            constraint=models.UniqueConstraint(fields=('patient', 'bucket'), name='userbpmminute_unique_bucket'),
+        ),
+        migrations.RunPython(backfill_rollups, migrations.RunPython.noop),
+    ]
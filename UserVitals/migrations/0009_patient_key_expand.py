@@ -0,0 +1,85 @@
+# Step 2 of 4 moving Patient to a bigint primary key (see Users 0016).
+# Copies every patient reference into a bigint shadow column, then drops
+# the email foreign keys so Users 0017 can swap Patient's primary key.
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+MODELS = ['uservitals', 'userbpm', 'userbpmminute', 'userbpmhour', 'userbpmday']
+
+
+def fill_keys(apps, schema_editor):
+    Patient = apps.get_model('Users', 'Patient')
+    patient_id = Subquery(Patient.objects.filter(email=OuterRef('patient_id')).values('id')[:1])
+    for model_name in MODELS:
+        apps.get_model('UserVitals', model_name).objects.update(patient_key=patient_id)
+
+
+def restore_patient_emails(apps, schema_editor):
+    # Reverse only: refills the re-added email foreign keys from patient_key
+    # before they become NOT NULL again.
+    Patient = apps.get_model('Users', 'Patient')
+    email = Subquery(Patient.objects.filter(id=OuterRef('patient_key')).values('email')[:1])
+    for model_name in MODELS:
+        apps.get_model('UserVitals', model_name).objects.update(patient_id=email)
+
+
+def nullable_patient(model_name):
+    # The email foreign key as it stands before this migration, made nullable.
+    if model_name == 'uservitals':
+        return models.OneToOneField(
+            null=True, on_delete=django.db.models.deletion.CASCADE, related_name='vitals', to='Users.patient'
+        )
+    if model_name == 'userbpm':
+        return models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, to='Users.patient')
+    return models.ForeignKey(
+        null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Users.patient'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserVitals', '0008_userbpm_recorded_at_and_rollups'),
+        ('Users', '0016_surrogate_keys_expand'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name=model_name,
+            name='patient_key',
+            field=models.BigIntegerField(null=True),
+        )
+        for model_name in MODELS
+    ] + [
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='userbpm',
+            name='userbpm_patient_recorded_idx',
+        ),
+    ] + [
+        migrations.RemoveConstraint(
+            model_name=model_name,
+            name=f'{model_name}_unique_bucket',
+        )
+        for model_name in ('userbpmminute', 'userbpmhour', 'userbpmday')
+    ] + [
+        # Nullable first, so unapplying can add the columns back to
+        # populated tables and fill them before restoring NOT NULL.
+        migrations.AlterField(
+            model_name=model_name,
+            name='patient',
+            field=nullable_patient(model_name),
+        )
+        for model_name in MODELS
+    ] + [
+        migrations.RunPython(migrations.RunPython.noop, restore_patient_emails),
+    ] + [
+        migrations.RemoveField(
+            model_name=model_name,
+            name='patient',
+        )
+        for model_name in MODELS
+    ]
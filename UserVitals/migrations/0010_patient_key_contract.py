@@ -0,0 +1,61 @@
+# Step 4 of 4 (see Users 0016). Turns the bigint patient shadow columns back
+# into foreign keys to Patient's new id and restores their indexes.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def restore_foreign_key(model_name, field):
+    nullable = field.clone()
+    nullable.null = True
+    return [
+        migrations.AlterField(
+            model_name=model_name,
+            name='patient_key',
+            field=nullable,
+        ),
+        migrations.RenameField(
+            model_name=model_name,
+            old_name='patient_key',
+            new_name='patient',
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name='patient',
+            field=field,
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserVitals', '0009_patient_key_expand'),
+        ('Users', '0017_surrogate_keys_contract'),
+    ]
+
+    operations = [
+        *restore_foreign_key('uservitals', models.OneToOneField(
+            on_delete=django.db.models.deletion.CASCADE, related_name='vitals', to='Users.patient'
+        )),
+        *restore_foreign_key('userbpm', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, to='Users.patient'
+        )),
+        *[
+            operation
+            for model_name in ('userbpmminute', 'userbpmhour', 'userbpmday')
+            for operation in restore_foreign_key(model_name, models.ForeignKey(
+                on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Users.patient'
+            ))
+        ],
+        migrations.AddIndex(
+            model_name='userbpm',
+            index=models.Index(fields=['patient', 'recorded_at'], name='userbpm_patient_recorded_idx'),
+        ),
+    ] + [
+        migrations.AddConstraint(
+            model_name=model_name,
+            constraint=models.UniqueConstraint(fields=('patient', 'bucket'), name=f'{model_name}_unique_bucket'),
+        )
+        for model_name in ('userbpmminute', 'userbpmhour', 'userbpmday')
+    ]
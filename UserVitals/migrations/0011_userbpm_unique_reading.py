@@ -0,0 +1,85 @@
+import datetime
+
+from django.db import migrations, models
+from django.db.models import Count, Max, Min, Sum
+from django.db.models.functions import Trunc
+
+
+ROLLUPS = [('UserBPMMinute', 'minute'), ('UserBPMHour', 'hour'), ('UserBPMDay', 'day')]
+
+# Databases migrated before 0008 spread legacy readings still hold every
+# pre-0008 UserBPM row at the one timestamp 0008 stamped them with. As in
+# 0008 they are spread back from it LEGACY_READING_SPACING apart, newest id
+# first, instead of being dropped.
+LEGACY_READING_SPACING = datetime.timedelta(minutes=5)
+
+
+def spread_legacy_readings(apps, schema_editor):
+    UserBPM = apps.get_model('UserVitals', 'UserBPM')
+    groups = list(
+        UserBPM.objects.values('patient_id', 'recorded_at').annotate(rows=Count('id')).filter(rows__gt=1).order_by()
+    )
+    taken = {}
+    for group in groups:
+        patient_id = group['patient_id']
+        if patient_id not in taken:
+            taken[patient_id] = set(
+                UserBPM.objects.filter(patient_id=patient_id).values_list('recorded_at', flat=True)
+            )
+        rows = list(UserBPM.objects.filter(
+            patient_id=patient_id, recorded_at=group['recorded_at']
+        ).order_by('-id').only('id', 'recorded_at'))[1:]
+
+        recorded_at = group['recorded_at']
+        for row in rows:
+            recorded_at -= LEGACY_READING_SPACING
+            while recorded_at in taken[patient_id]:
+                recorded_at -= LEGACY_READING_SPACING
+            row.recorded_at = recorded_at
+            taken[patient_id].add(recorded_at)
+        UserBPM.objects.bulk_update(rows, ['recorded_at'], batch_size=1000)
+
+
+def spread_duplicate_readings(apps, schema_editor):
+    # The rollups counted every reading in the shared bucket, so the
+    # affected patients' rollups are rebuilt from the spread rows.
+    UserBPM = apps.get_model('UserVitals', 'UserBPM')
+    patient_ids = set(
+        UserBPM.objects.values('patient_id', 'recorded_at').annotate(rows=Count('id')).filter(rows__gt=1)
+        .values_list('patient_id', flat=True)
+    )
+    if not patient_ids:
+        return
+    spread_legacy_readings(apps, schema_editor)
+
+    for model_name, kind in ROLLUPS:
+        model = apps.get_model('UserVitals', model_name)
+        model.objects.filter(patient_id__in=patient_ids).delete()
+        rows = UserBPM.objects.filter(patient_id__in=patient_ids, heart_rate__isnull=False).values(
+            'patient_id', bucket=Trunc('recorded_at', kind, tzinfo=datetime.timezone.utc)
+        ).annotate(
+            count=Count('id'),
+            total=Sum('heart_rate'),
+            minimum=Min('heart_rate'),
+            maximum=Max('heart_rate')
+        ).order_by()
+        model.objects.bulk_create([model(**row) for row in rows], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('UserVitals', '0010_patient_key_contract'),
+    ]
+
+    operations = [
+        migrations.RunPython(spread_duplicate_readings, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='userbpm',
+            name='userbpm_patient_recorded_idx',
+        ),
+        migrations.AddConstraint(
+            model_name='userbpm',
+            constraint=models.UniqueConstraint(fields=('patient', 'recorded_at'), name='userbpm_unique_reading'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from Users.models import Patient
 
 class UserVitals(models.Model):
@@ -9,14 +10,49 @@ class UserVitals(models.Model):
     diastolic_blood_pressure = models.FloatField(null=True,blank=True)
     heart_rate = models.FloatField(null=True,blank=True)
     oxygen_sat = models.FloatField(null=True,blank=True)    
+    updated_at = models.DateTimeField(auto_now=True,null=True)
 
 
 class UserBPM(models.Model):
     patient = models.ForeignKey(Patient,on_delete=models.CASCADE)
     heart_rate = models.FloatField(null=True,blank=True)
+    recorded_at = models.DateTimeField(default=timezone.now)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'recorded_at'], name='userbpm_unique_reading')
+        ]
 
-    
 
+class BPMRollup(models.Model):
+    # Kept up to date by UserVitals.rollups.record_bpm on every UserBPM insert.
+    patient = models.ForeignKey(Patient,on_delete=models.CASCADE,related_name='+')
+    bucket = models.DateTimeField()
+    count = models.IntegerField(default=0)
+    total = models.FloatField(default=0.0)
+    minimum = models.FloatField(null=True,blank=True)
+    maximum = models.FloatField(null=True,blank=True)
 
+    class Meta:
+        abstract = True
+        constraints = [
+            models.UniqueConstraint(fields=['patient', 'bucket'], name='%(class)s_unique_bucket')
+        ]
 
+    @property
+    def average(self):
+        if not self.count:
+            return None
+        return self.total / self.count
+
+
+class UserBPMMinute(BPMRollup):
+    pass
+
+
+class UserBPMHour(BPMRollup):
+    pass
+
+
+class UserBPMDay(BPMRollup):
+    pass
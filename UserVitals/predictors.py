@@ -0,0 +1,68 @@
+from abc import ABC, abstractmethod
+from functools import lru_cache
+
+from django.conf import settings
+
+from HeartAI import outbound
+
+
+class PredictionError(Exception):
+    pass
+
+
+class Predictor(ABC):
+    name = None
+
+    @abstractmethod
+    def predict(self, heartbeat):
+        pass
+
+
+class RemotePredictor(Predictor):
+    name = 'remote'
+
+    def __init__(self, url, timeout):
+        self.url = url
+        self.timeout = timeout
+
+    def predict(self, heartbeat):
+        response = outbound.post(
+            'prediction',
+            self.url,
+            json={'heartbeat': heartbeat},
+            timeout=self.timeout
+        )
+        response.raise_for_status()
+        return response.json()
+
+
+@lru_cache(maxsize=None)
+def load_local_model(path):
+    # NumPy is only needed by the local backend, so it is imported on first use.
+    from .hrv import LogisticModel
+    try:
+        return LogisticModel.load(path)
+    except (OSError, KeyError, ValueError) as e:
+        raise PredictionError(f"Could not load model file {path}: {e}") from e
+
+
+class LocalPredictor(Predictor):
+    name = 'local'
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+
+    def predict(self, heartbeat):
+        if not self.model_path:
+            raise PredictionError("AI_PREDICTOR_MODEL_PATH is not configured")
+        model = load_local_model(self.model_path)
+        try:
+            return model.predict(heartbeat)
+        except ValueError as e:
+            raise PredictionError(str(e)) from e
+
+
+def get_predictor():
+    if settings.AI_PREDICTOR_BACKEND == 'local':
+        return LocalPredictor(settings.AI_PREDICTOR_MODEL_PATH)
+    return RemotePredictor(settings.AI_PREDICTION_URL, settings.AI_PREDICTION_TIMEOUT)
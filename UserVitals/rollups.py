@@ -0,0 +1,97 @@
+from datetime import timezone as dt_timezone
+
+from django.db import connection,transaction
+
+from Users.models import Patient
+from .models import UserBPM,UserBPMMinute,UserBPMHour,UserBPMDay
+
+
+ROLLUPS = [
+    (UserBPMMinute, lambda at: at.replace(second=0, microsecond=0)),
+    (UserBPMHour, lambda at: at.replace(minute=0, second=0, microsecond=0)),
+    (UserBPMDay, lambda at: at.replace(hour=0, minute=0, second=0, microsecond=0)),
+]
+
+ROLLUP_CHUNK_SIZE = 500
+
+
+def bucket_readings(readings, truncate):
+    buckets = {}
+    for recorded_at, heart_rate in readings:
+        bucket = truncate(recorded_at.astimezone(dt_timezone.utc))
+        count, total, minimum, maximum = buckets.get(bucket, (0, 0.0, heart_rate, heart_rate))
+        buckets[bucket] = (
+            count + 1,
+            total + heart_rate,
+            min(minimum, heart_rate),
+            max(maximum, heart_rate)
+        )
+    return buckets
+
+
+def upsert_rollup(model, patient_id, buckets):
+    # One INSERT ... ON CONFLICT per chunk adds the new readings to whatever
+    # the bucket already holds, so concurrent writers cannot lose updates.
+    qn = connection.ops.quote_name
+    table = qn(model._meta.db_table)
+    columns = ['patient_id', 'bucket', 'count', 'total', 'minimum', 'maximum']
+    items = list(buckets.items())
+
+    with connection.cursor() as cursor:
+        for i in range(0, len(items), ROLLUP_CHUNK_SIZE):
+            chunk = items[i:i + ROLLUP_CHUNK_SIZE]
+            placeholders = ', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(chunk))
+            params = []
+            for bucket, (count, total, minimum, maximum) in chunk:
+                params.extend([patient_id, bucket, count, total, minimum, maximum])
+
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(qn(column) for column in columns)}) "
+                f"VALUES {placeholders} "
+                f"ON CONFLICT ({qn('patient_id')}, {qn('bucket')}) DO UPDATE SET "
+                f"{qn('count')} = {table}.{qn('count')} + excluded.{qn('count')}, "
+                f"{qn('total')} = {table}.{qn('total')} + excluded.{qn('total')}, "
+                f"{qn('minimum')} = CASE WHEN excluded.{qn('minimum')} < {table}.{qn('minimum')} "
+                f"THEN excluded.{qn('minimum')} ELSE {table}.{qn('minimum')} END, "
+                f"{qn('maximum')} = CASE WHEN excluded.{qn('maximum')} > {table}.{qn('maximum')} "
+                f"THEN excluded.{qn('maximum')} ELSE {table}.{qn('maximum')} END",
+                params
+            )
+
+
+def update_rollups(patient_id, readings):
+    readings = [(recorded_at, heart_rate) for recorded_at, heart_rate in readings if heart_rate is not None]
+    if not readings:
+        return
+    for model, truncate in ROLLUPS:
+        upsert_rollup(model, patient_id, bucket_readings(readings, truncate))
+
+
+def record_bpm(patient, readings, batch_size=1000):
+    # `readings` is an iterable of (recorded_at, heart_rate) pairs with
+    # distinct timestamps. Readings the patient already has are skipped;
+    # returns the ones that were inserted.
+    readings = list(readings)
+    if not readings:
+        return []
+    with transaction.atomic():
+        # Locking the patient serialises writers, so the rollups only count
+        # rows this call inserted. The unique constraint still backs it up.
+        Patient.objects.select_for_update().filter(pk=patient.pk).exists()
+        existing = set(UserBPM.objects.filter(
+            patient = patient,
+            recorded_at__gte = min(recorded_at for recorded_at, _ in readings),
+            recorded_at__lte = max(recorded_at for recorded_at, _ in readings)
+        ).values_list('recorded_at', flat=True))
+        readings = [(recorded_at, heart_rate) for recorded_at, heart_rate in readings if recorded_at not in existing]
+
+        UserBPM.objects.bulk_create(
+            [
+                UserBPM(patient = patient, heart_rate = heart_rate, recorded_at = recorded_at)
+                for recorded_at, heart_rate in readings
+            ],
+            batch_size=batch_size,
+            ignore_conflicts=True
+        )
+        update_rollups(patient.pk, readings)
+    return readings
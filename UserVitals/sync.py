@@ -0,0 +1,147 @@
+import logging
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import OperationalError,close_old_connections,connection,transaction
+from django.utils import timezone
+
+from Users.models import Patient,SyncWatermark
+from . import vitals_cache
+from .google_fit import fetch_vitals,get_fitness_service
+from .google_tokens import fresh_credentials,save_credentials
+from .models import UserVitals
+from .rollups import record_bpm
+
+
+logger = logging.getLogger(__name__)
+
+
+def sync_patient(patient):
+    user_credentials = fresh_credentials(patient.credentials)
+
+    now = int(time.time() * 1000)
+
+    previous = {}
+    if settings.GOOGLE_FIT_INCREMENTAL:
+        previous = {
+            watermark.data_source: (watermark.synced_until, watermark.state)
+            for watermark in patient.sync_watermarks.all()
+        }
+    vitals, states = fetch_vitals(get_fitness_service(), user_credentials, previous, now)
+
+    watermarks = []
+    if settings.GOOGLE_FIT_INCREMENTAL:
+        watermarks = [
+            SyncWatermark(patient = patient, data_source = data_source, synced_until = now, state = state)
+            for data_source, state in states.items()
+        ]
+
+    # google-auth may still have refreshed the token mid-fetch (e.g. after
+    # a 401); keep whatever it obtained.
+    save_credentials(patient.credentials, user_credentials)
+
+    with transaction.atomic():
+        user_vitals, _ = UserVitals.objects.update_or_create(
+            patient = patient,
+            defaults=vitals
+        )
+
+        if vitals['heart_rate'] is not None:
+            record_bpm(patient, [(timezone.now(), vitals['heart_rate'])])
+
+        if watermarks:
+            SyncWatermark.objects.bulk_create(
+                watermarks,
+                update_conflicts=True,
+                unique_fields=['patient', 'data_source'],
+                update_fields=['synced_until', 'state', 'updated_at']
+            )
+
+    return user_vitals
+
+
+# SQLSTATE Postgres reports when lock_timeout runs out.
+LOCK_NOT_AVAILABLE = '55P03'
+
+
+@contextmanager
+def sync_lock(patient_id):
+    # Session-level Postgres advisory lock keyed on the patient id, shared by
+    # every worker process. Waiting is bounded by VITALS_SYNC_WAIT_TIMEOUT.
+    if connection.vendor != 'postgresql':
+        yield
+        return
+
+    try:
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT set_config('lock_timeout', %s, true)",
+                [f'{int(settings.VITALS_SYNC_WAIT_TIMEOUT * 1000)}ms']
+            )
+            cursor.execute('SELECT pg_advisory_lock(%s)', [patient_id])
+    except OperationalError as e:
+        cause = e.__cause__
+        if getattr(cause, 'pgcode', None) == LOCK_NOT_AVAILABLE or getattr(cause, 'sqlstate', None) == LOCK_NOT_AVAILABLE:
+            raise vitals_cache.SyncWaitTimeout(f"Timed out waiting for the vitals sync of patient {patient_id}") from e
+        raise
+
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_unlock(%s)', [patient_id])
+
+
+def sync_stale_patient(patient, fresh_after):
+    # Requests in other worker processes sync the same patient one at a
+    # time; whoever gets the lock after a sync reads its row instead of
+    # calling Google again.
+    with sync_lock(patient.pk):
+        user_vitals = UserVitals.objects.filter(patient = patient, updated_at__gte = fresh_after).first()
+        if user_vitals is not None:
+            return user_vitals
+        return sync_patient(patient)
+
+
+def in_shard(patient_pk, shard, shards):
+    return zlib.crc32(str(patient_pk).encode()) % shards == shard
+
+
+def _sync_in_worker(patient):
+    # Worker threads hold their own database connection between cycles.
+    close_old_connections()
+    try:
+        sync_patient(patient)
+        return True
+    except Exception:
+        logger.exception("Vitals sync failed for patient %s", patient.pk)
+        return False
+    finally:
+        close_old_connections()
+
+
+def sync_all(executor, shard=0, shards=1):
+    patients = Patient.objects.filter(
+        credentials__isnull=False
+    ).select_related('credentials').prefetch_related('sync_watermarks')
+    patients = [patient for patient in patients if in_shard(patient.pk, shard, shards)]
+    results = list(executor.map(_sync_in_worker, patients))
+    return results.count(True), results.count(False)
+
+
+def run_worker(interval, workers, shard=0, shards=1, once=False):
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='vitals-sync') as executor:
+        while True:
+            started = time.monotonic()
+            synced, failed = sync_all(executor, shard, shards)
+            elapsed = time.monotonic() - started
+            logger.info(
+                "Synced vitals for %d patients (%d failed) in %.1fs",
+                synced, failed, elapsed
+            )
+            if once:
+                return synced, failed
+            time.sleep(max(interval - elapsed, 0))
@@ -1,3 +1,677 @@
-from django.test import TestCase
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+from unittest import mock
+from urllib.parse import unquote, urlsplit
 
-# Create your tests here.
+import requests
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.utils import timezone
+
+from HeartAI.fakes import FakeFitHttp,FakeServiceAdapter
+from HeartAI.query_budget import has_query_budget,routed_views
+from HeartAI.testing import QueryBudgetTestMixin
+from Users.models import Doctor,Patient,SyncWatermark,UserCredentials
+from . import google_fit,vitals_cache
+from .ingest import ingest_readings
+from .models import UserBPM,UserBPMMinute,UserVitals
+from .predictors import LocalPredictor,PredictionError,Predictor,load_local_model
+from .sync import sync_patient
+
+# Imports a gunicorn worker makes before serving its first request, timed in
+# a fresh interpreter so nothing is already cached in sys.modules.
+BOOT_SCRIPT = """
+import json, sys, time
+started = time.perf_counter()
+import django
+django.setup()
+import HeartAI.urls, HeartAI.wsgi
+elapsed = time.perf_counter() - started
+print(json.dumps({'elapsed': elapsed, 'modules': sorted(sys.modules)}))
+"""
+
+# Only needed once a request actually talks to Google or uploads readings.
+LAZY_MODULES = [
+    'google_auth_oauthlib',
+    'googleapiclient.discovery',
+    'google_auth_httplib2',
+    'google.oauth2.credentials',
+    'httplib2',
+    'numpy',
+]
+
+
+class WorkerBootTests(SimpleTestCase):
+    def boot(self):
+        result = subprocess.run(
+            [sys.executable, '-c', BOOT_SCRIPT],
+            cwd=settings.BASE_DIR,
+            env={**os.environ, 'DJANGO_SETTINGS_MODULE': 'HeartAI.settings'},
+            capture_output=True,
+            text=True,
+            check=True
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_heavy_dependencies_are_not_imported_at_boot(self):
+        modules = set(self.boot()['modules'])
+        self.assertEqual([name for name in LAZY_MODULES if name in modules], [])
+
+    def test_boot_fits_import_budget(self):
+        # Best of three, so a single slow run on a busy machine does not fail.
+        budget = float(os.environ.get('WORKER_IMPORT_BUDGET', 1.5))
+        elapsed = min(self.boot()['elapsed'] for _ in range(3))
+        self.assertLess(elapsed, budget, f"Worker boot took {elapsed:.2f}s (budget {budget:.2f}s)")
+
+
+
+class VitalsQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(first_name='Ada', last_name='Heart', email='ada@example.com')
+        cls.patients = [
+            Patient.objects.create(
+                first_name='Pat', last_name=str(i), email=f'pat{i}@example.com', doctor=cls.doctor
+            ) for i in range(5)
+        ]
+        cls.patient = cls.patients[0]
+        now = timezone.now()
+        for patient in cls.patients:
+            UserVitals.objects.create(patient=patient, steps=1000, heart_rate=70.0)
+            UserBPM.objects.bulk_create([
+                UserBPM(patient=patient, heart_rate=60 + i, recorded_at=now - timedelta(minutes=i))
+                for i in range(20)
+            ])
+        UserCredentials.objects.create(
+            patient=cls.patient, access_token='token', refresh_token='refresh',
+            token_uri='https://oauth2.googleapis.com/token', client_id='id', client_secret='secret',
+            scopes=[], expires_at=now + timedelta(hours=1)
+        )
+
+    def setUp(self):
+        vitals_cache.clear()
+
+    def test_fetch_data_stored(self):
+        response = self.request_within_budget('get', '/vitals/health_data/', **self.auth_headers(self.patient))
+        self.assertEqual(response.json()['steps'], 1000)
+
+    def test_fetch_data_as_doctor(self):
+        response = self.request_within_budget(
+            'get', f'/vitals/health_data/?email={self.patient.email}', **self.auth_headers(self.doctor)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_fetch_data_sync(self):
+        # update() skips auto_now, so the stored row really is a day old.
+        UserVitals.objects.filter(patient=self.patient).update(updated_at=timezone.now() - timedelta(days=1))
+        with mock.patch('googleapiclient.http.build_http', return_value=FakeFitHttp()), \
+                mock.patch.object(google_fit, '_service', None), \
+                mock.patch.object(google_fit, '_local', threading.local()):
+            response = self.request_within_budget(
+                'get', '/vitals/health_data/', **self.auth_headers(self.patient)
+            )
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertNotEqual(response.json()['steps'], 1000)
+
+    def test_fetch_data_clamps_max_age(self):
+        with mock.patch('UserVitals.sync.sync_patient') as sync:
+            response = self.client.get('/vitals/health_data/?max_age=0', **self.auth_headers(self.patient))
+        self.assertEqual(response.json()['steps'], 1000)
+        sync.assert_not_called()
+
+    def test_fetch_data_max_age_floor_is_configurable(self):
+        with self.settings(VITALS_MIN_AGE=0), mock.patch('UserVitals.sync.sync_patient') as sync:
+            sync.return_value = UserVitals.objects.get(patient=self.patient)
+            self.client.get('/vitals/health_data/?max_age=0', **self.auth_headers(self.patient))
+        sync.assert_called_once()
+
+    def test_fetch_data_served_from_cache(self):
+        headers = self.auth_headers(self.patient)
+        self.client.get('/vitals/health_data/', **headers)
+        with self.assertNumQueries(0):
+            response = self.client.get('/vitals/health_data/', **headers)
+        self.assertEqual(response.json()['steps'], 1000)
+
+    def test_fetch_data_rejects_invalid_max_age(self):
+        response = self.client.get('/vitals/health_data/?max_age=-5', **self.auth_headers(self.patient))
+        self.assertEqual(response.status_code, 400)
+
+    def test_ai_pred(self):
+        predictor = mock.Mock(name='predictor')
+        predictor.name = 'test'
+        predictor.predict.return_value = {'prediction': 0}
+        with mock.patch('UserVitals.views.get_predictor', return_value=predictor):
+            response = self.request_within_budget(
+                'get', f'/vitals/AI/?email={self.patient.email}', **self.auth_headers(self.doctor)
+            )
+        self.assertEqual(response.json(), {'prediction': 0})
+
+    def test_doctor_dashboard(self):
+        response = self.request_within_budget('get', '/vitals/dashboard/', **self.auth_headers(self.doctor))
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_doctor_dashboard_follows_cursors(self):
+        emails = self.follow_pages('/vitals/dashboard/?page_size=2', 'email', **self.auth_headers(self.doctor))
+        self.assertEqual(emails, [patient.email for patient in self.patients])
+        response = self.client.get('/vitals/dashboard/?cursor=bad!', **self.auth_headers(self.doctor))
+        self.assertEqual(response.status_code, 404)
+
+    def test_export_bpm(self):
+        response = self.request_within_budget(
+            'get', f'/vitals/bpm/export/?email={self.patient.email}', **self.auth_headers(self.doctor)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_ingest_bpm(self):
+        start = int(timezone.now().timestamp() * 1000) - 3600000
+        response = self.request_within_budget('post', '/vitals/bpm/ingest/', data=[
+            {'timestamp': start + i * 1000, 'heart_rate': 70} for i in range(50)
+        ], content_type='application/json', **self.auth_headers(self.patient))
+        self.assertEqual(response.json()['inserted'], 50)
+
+
+class IngestTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(first_name='Pat', last_name='Ingest', email='ingest@example.com')
+        cls.start = int(timezone.now().timestamp() * 1000) - 3600000
+
+    def ingest(self, readings):
+        return ingest_readings(self.patient, readings)
+
+    def minute_counts(self):
+        return sum(UserBPMMinute.objects.filter(patient=self.patient).values_list('count', flat=True))
+
+    def test_invalid_readings_are_rejected_by_index(self):
+        future = int(timezone.now().timestamp() * 1000) + 3600000
+        result = self.ingest([
+            {'timestamp': self.start, 'heart_rate': 70},
+            'not an object',
+            {'timestamp': True, 'heart_rate': 70},
+            {'timestamp': 'yesterday', 'heart_rate': 70},
+            {'timestamp': self.start + 1000},
+            {'timestamp': self.start + 2000, 'heart_rate': 5},
+            {'timestamp': self.start + 3000, 'heart_rate': '70'},
+            {'timestamp': future, 'heart_rate': 70},
+        ])
+        self.assertEqual(result['rejected'], [1, 2, 3, 4, 5, 6, 7])
+        self.assertEqual(result['inserted'], 1)
+
+    def test_ints_past_the_float_range_are_rejected(self):
+        huge = int('9' * 400)
+        result = self.ingest([
+            {'timestamp': self.start, 'heart_rate': 70},
+            {'timestamp': huge, 'heart_rate': 70},
+            {'timestamp': self.start + 1000, 'heart_rate': huge},
+        ])
+        self.assertEqual(result['rejected'], [1, 2])
+        self.assertEqual(result['inserted'], 1)
+
+    def test_iso_timestamps_honour_their_offset(self):
+        result = self.ingest([
+            {'timestamp': '2026-01-01T12:00:00.250Z', 'heart_rate': 70},
+            {'timestamp': '2026-01-01T14:00:01+02:00', 'heart_rate': 80},
+            {'timestamp': '2026-01-01 12:00:02', 'heart_rate': 90},
+        ])
+        self.assertEqual(result['inserted'], 3)
+        self.assertEqual(
+            list(UserBPM.objects.filter(patient=self.patient).order_by('recorded_at').values_list('recorded_at', flat=True)),
+            [
+                datetime(2026, 1, 1, 12, 0, 0, 250000, tzinfo=dt_timezone.utc),
+                datetime(2026, 1, 1, 12, 0, 1, tzinfo=dt_timezone.utc),
+                datetime(2026, 1, 1, 12, 0, 2, tzinfo=dt_timezone.utc),
+            ]
+        )
+
+    def test_last_reading_wins_within_a_batch(self):
+        result = self.ingest([
+            {'timestamp': self.start, 'heart_rate': 70},
+            {'timestamp': self.start, 'heart_rate': 75},
+        ])
+        self.assertEqual((result['inserted'], result['duplicates']), (1, 1))
+        self.assertEqual(UserBPM.objects.get(patient=self.patient).heart_rate, 75)
+
+    def test_stored_readings_are_skipped(self):
+        readings = [{'timestamp': self.start + i * 1000, 'heart_rate': 70} for i in range(10)]
+        self.ingest(readings[:6])
+        result = self.ingest(readings)
+        self.assertEqual((result['inserted'], result['duplicates']), (4, 6))
+        self.assertEqual(UserBPM.objects.filter(patient=self.patient).count(), 10)
+        self.assertEqual(self.minute_counts(), 10)
+
+    def test_database_rejects_a_duplicate_reading(self):
+        recorded_at = timezone.now()
+        UserBPM.objects.create(patient=self.patient, heart_rate=70, recorded_at=recorded_at)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            UserBPM.objects.create(patient=self.patient, heart_rate=71, recorded_at=recorded_at)
+
+    def test_ndjson_upload(self):
+        body = '\n'.join(
+            json.dumps({'timestamp': self.start + i * 1000, 'heart_rate': 70}) for i in range(3)
+        ) + '\n\n'
+        response = self.client.post(
+            '/vitals/bpm/ingest/', data=body, content_type='application/x-ndjson',
+            **self.auth_headers(self.patient)
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.json()['inserted'], 3)
+
+    def test_malformed_ndjson_is_rejected(self):
+        response = self.client.post(
+            '/vitals/bpm/ingest/', data='{"timestamp": 1, "heart_rate": 70}\n{oops\n',
+            content_type='application/x-ndjson', **self.auth_headers(self.patient)
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+class LegacyReadingMigrationTests(TransactionTestCase):
+    # UserBPM rows stored before recorded_at existed (0008) and rows that
+    # still share 0008's timestamp (0011) are kept and spread apart.
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def tearDown(self):
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+
+    def seed(self, apps, **fields):
+        patient = apps.get_model('Users', 'Patient').objects.create(
+            email='legacy@example.com', first_name='Pat', last_name='Legacy'
+        )
+        UserBPM = apps.get_model('UserVitals', 'UserBPM')
+        for heart_rate in range(60, 70):
+            UserBPM.objects.create(patient=patient, heart_rate=heart_rate, **fields)
+
+    def assert_spread(self):
+        patient = Patient.objects.get(email='legacy@example.com')
+        readings = list(UserBPM.objects.filter(patient=patient).order_by('id'))
+        self.assertEqual([reading.heart_rate for reading in readings], list(range(60, 70)))
+        self.assertEqual(
+            [later.recorded_at - earlier.recorded_at for earlier, later in zip(readings, readings[1:])],
+            [timedelta(minutes=5)] * 9
+        )
+        self.assertEqual(
+            list(UserBPMMinute.objects.filter(patient=patient).values_list('count', flat=True)), [1] * 10
+        )
+
+    def test_readings_without_recorded_at(self):
+        self.seed(self.migrate([
+            ('Users', '0015_assignmentrequest_pending_constraints'),
+            ('UserVitals', '0007_uservitals_updated_at'),
+        ]))
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        self.assert_spread()
+
+    def test_readings_sharing_a_timestamp(self):
+        self.seed(self.migrate([('UserVitals', '0010_patient_key_contract')]), recorded_at=timezone.now())
+        self.migrate(MigrationExecutor(connection).loader.graph.leaf_nodes())
+        self.assert_spread()
+
+
+class RecordingPredictor(Predictor):
+    name = 'recording'
+
+    def __init__(self):
+        self.calls = []
+
+    def predict(self, heartbeat):
+        self.calls.append(heartbeat)
+        return {'prediction': len(self.calls)}
+
+
+class AiPredTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(first_name='Pat', last_name='Pred', email='pred@example.com')
+        now = timezone.now()
+        UserBPM.objects.bulk_create([
+            UserBPM(patient=cls.patient, heart_rate=60 + i, recorded_at=now - timedelta(minutes=i))
+            for i in range(5)
+        ] + [
+            UserBPM(patient=cls.patient, heart_rate=None, recorded_at=now - timedelta(minutes=10)),
+            UserBPM(patient=cls.patient, heart_rate=100, recorded_at=now - timedelta(hours=3)),
+        ])
+
+    def setUp(self):
+        cache.clear()
+        self.predictor = RecordingPredictor()
+        patcher = mock.patch('UserVitals.views.get_predictor', return_value=self.predictor)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def predict(self):
+        return self.client.get('/vitals/AI/', **self.auth_headers(self.patient))
+
+    def test_sends_the_window_oldest_first(self):
+        with self.settings(AI_PRED_WINDOW_HOURS=1):
+            self.predict()
+        self.assertEqual(self.predictor.calls, [[64.0, 63.0, 62.0, 61.0, 60.0]])
+
+    def test_sends_at_most_the_newest_readings(self):
+        with self.settings(AI_PRED_MAX_READINGS=3):
+            self.predict()
+        self.assertEqual(self.predictor.calls, [[62.0, 61.0, 60.0]])
+
+    def test_no_readings_in_the_window(self):
+        UserBPM.objects.filter(patient=self.patient, recorded_at__gte=timezone.now() - timedelta(hours=1)).delete()
+        with self.settings(AI_PRED_WINDOW_HOURS=1):
+            response = self.predict()
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.predictor.calls, [])
+
+    def test_prediction_is_cached_until_a_new_reading_arrives(self):
+        self.assertEqual(self.predict().json(), {'prediction': 1})
+        self.assertEqual(self.predict().json(), {'prediction': 1})
+        self.assertEqual(len(self.predictor.calls), 1)
+
+        UserBPM.objects.create(patient=self.patient, heart_rate=90, recorded_at=timezone.now())
+        self.assertEqual(self.predict().json(), {'prediction': 2})
+        self.assertEqual(self.predictor.calls[-1][-1], 90.0)
+
+
+class RecordingFitHttp(FakeFitHttp):
+    def __init__(self, calls):
+        super().__init__()
+        self.calls = calls
+
+    def request(self, uri, method='GET', body=None, headers=None, **kwargs):
+        self.calls.append((urlsplit(uri).path, json.loads(body) if body else None))
+        return super().request(uri, method, body, headers, **kwargs)
+
+
+class GoogleFitSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.patient = Patient.objects.create(first_name='Pat', last_name='Sync', email='sync@example.com')
+        UserCredentials.objects.create(
+            patient=cls.patient, access_token='token', refresh_token='refresh',
+            token_uri='https://oauth2.googleapis.com/token', client_id='id', client_secret='secret',
+            scopes=[], expires_at=timezone.now() + timedelta(hours=1)
+        )
+
+    def sync(self):
+        calls = []
+        patient = Patient.objects.get(pk=self.patient.pk)
+        with mock.patch('googleapiclient.http.build_http', side_effect=lambda: RecordingFitHttp(calls)), \
+                mock.patch.object(google_fit, '_service', None), \
+                mock.patch.object(google_fit, '_local', threading.local()), \
+                mock.patch.object(requests.Session, 'get_adapter', return_value=FakeServiceAdapter()):
+            user_vitals = sync_patient(patient)
+        return user_vitals, calls
+
+    def test_expired_token_is_refreshed_and_saved(self):
+        UserCredentials.objects.filter(patient=self.patient).update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.sync()
+
+        credentials = UserCredentials.objects.get(patient=self.patient)
+        self.assertTrue(credentials.access_token.startswith('bench-access-'))
+        self.assertEqual(credentials.refresh_token, 'refresh')
+        self.assertGreater(credentials.expires_at, timezone.now() + timedelta(minutes=50))
+
+    def test_valid_token_is_kept(self):
+        self.sync()
+        self.assertEqual(UserCredentials.objects.get(patient=self.patient).access_token, 'token')
+
+    def test_dense_sources_are_read_through_one_bucketed_aggregate(self):
+        user_vitals, calls = self.sync()
+
+        aggregates = [body for path, body in calls if path.endswith('/dataset:aggregate')]
+        raw_sources = {unquote(path.split('/dataSources/')[1].split('/')[0]) for path, _ in calls if '/dataSources/' in path}
+        self.assertEqual(len(aggregates), 1)
+        self.assertEqual(aggregates[0]['bucketByTime'], {'durationMillis': google_fit.BUCKET_MILLIS})
+        self.assertEqual(raw_sources, set(google_fit.LATEST_SOURCES))
+        self.assertGreater(user_vitals.steps, 0)
+        self.assertIsNotNone(user_vitals.heart_rate)
+
+    def test_next_sync_only_aggregates_from_the_watermark_bucket(self):
+        self.sync()
+        synced_until = SyncWatermark.objects.filter(patient=self.patient).values_list('synced_until', flat=True)[0]
+
+        _, calls = self.sync()
+        aggregate = next(body for path, body in calls if path.endswith('/dataset:aggregate'))
+        self.assertEqual(aggregate['startTimeMillis'], google_fit.bucket_start(synced_until))
+
+
+class RefreshGoogleTokensCommandTests(TransactionTestCase):
+    # The command refreshes on a thread pool, whose connections only see
+    # committed rows.
+    def setUp(self):
+        now = timezone.now()
+        for email, expires_at, refresh_token in [
+            ('soon@example.com', now + timedelta(minutes=5), 'refresh'),
+            ('expired@example.com', now - timedelta(hours=1), 'refresh'),
+            ('later@example.com', now + timedelta(hours=2), 'refresh'),
+            ('revoked@example.com', now - timedelta(hours=1), ''),
+        ]:
+            UserCredentials.objects.create(
+                patient=Patient.objects.create(first_name='Pat', last_name='Token', email=email),
+                access_token='token', refresh_token=refresh_token,
+                token_uri='https://oauth2.googleapis.com/token', client_id='id', client_secret='secret',
+                scopes=[], expires_at=expires_at
+            )
+
+    def test_refreshes_only_tokens_about_to_expire(self):
+        out = io.StringIO()
+        with self.settings(GOOGLE_TOKEN_REFRESH_AHEAD=600), \
+                mock.patch.object(requests.Session, 'get_adapter', return_value=FakeServiceAdapter()):
+            call_command('refresh_google_tokens', '--once', '--workers', '2', stdout=out)
+
+        self.assertEqual(out.getvalue().strip(), "Refreshed 2 Google tokens (0 failed)")
+        tokens = dict(UserCredentials.objects.values_list('patient__email', 'access_token'))
+        self.assertEqual(
+            sorted(email for email, token in tokens.items() if token.startswith('bench-access-')),
+            ['expired@example.com', 'soon@example.com']
+        )
+        self.assertEqual(tokens['later@example.com'], 'token')
+        self.assertEqual(tokens['revoked@example.com'], 'token')
+
+
+class LocalPredictorTests(SimpleTestCase):
+    heartbeat = [60, 62, 64, 66, 68, 70]
+
+    def setUp(self):
+        from . import hrv
+
+        load_local_model.cache_clear()
+        self.addCleanup(load_local_model.cache_clear)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'model.npz')
+
+        # Only mean_bpm carries weight, standardised around 65 bpm.
+        weights = [0.0] * len(hrv.FEATURE_NAMES)
+        weights[0] = 1.0
+        hrv.LogisticModel(
+            weights=weights,
+            bias=0.0,
+            mean=[65.0] + [0.0] * (len(hrv.FEATURE_NAMES) - 1),
+            scale=[1.0] * len(hrv.FEATURE_NAMES),
+            threshold=0.5
+        ).save(self.path)
+
+    def test_extract_features(self):
+        from .hrv import FEATURE_NAMES, extract_features
+
+        features = dict(zip(FEATURE_NAMES, extract_features(self.heartbeat + [0, float('nan')])))
+        self.assertAlmostEqual(features['mean_bpm'], 65.0)
+        self.assertAlmostEqual(features['min_bpm'], 60.0)
+        self.assertAlmostEqual(features['max_bpm'], 70.0)
+        self.assertAlmostEqual(features['trend'], 2.0)
+        self.assertAlmostEqual(features['rolling_mean_last'], 66.0)
+        self.assertAlmostEqual(features['rolling_mean_min'], 64.0)
+        self.assertAlmostEqual(features['pnn50'], 0.0)
+
+    def test_extract_features_rejects_empty_input(self):
+        from .hrv import extract_features
+
+        with self.assertRaises(ValueError):
+            extract_features([0, float('nan')])
+
+    def test_predict_from_saved_model(self):
+        predictor = LocalPredictor(self.path)
+        self.assertEqual(predictor.predict([80, 82, 84])['prediction'], 1)
+
+        result = predictor.predict(self.heartbeat)
+        self.assertEqual(result['prediction'], 1)
+        self.assertAlmostEqual(result['probability'], 0.5)
+        self.assertAlmostEqual(result['features']['mean_bpm'], 65.0)
+        self.assertEqual(predictor.predict([50, 52, 54])['prediction'], 0)
+
+    def test_missing_model_file(self):
+        with self.assertRaises(PredictionError):
+            LocalPredictor(os.path.join(os.path.dirname(self.path), 'missing.npz')).predict(self.heartbeat)
+
+    def test_unconfigured_model_path(self):
+        with self.assertRaises(PredictionError):
+            LocalPredictor('').predict(self.heartbeat)
+
+    def test_predictor_base_class_is_abstract(self):
+        with self.assertRaises(TypeError):
+            Predictor()
+
+
+class SingleFlightTests(SimpleTestCase):
+    def setUp(self):
+        vitals_cache.clear()
+
+    def run_concurrently(self, fetch, callers=5):
+        results, errors = [], []
+
+        def call():
+            try:
+                results.append(vitals_cache.single_flight('patient', fetch))
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=call) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results, errors
+
+    def test_concurrent_callers_share_one_fetch(self):
+        calls = []
+        release = threading.Event()
+
+        def fetch():
+            calls.append(1)
+            # Hold the flight open until every caller has had time to join it.
+            release.wait(5)
+            return UserVitals(steps=1, updated_at=timezone.now())
+
+        threading.Timer(0.2, release.set).start()
+        results, errors = self.run_concurrently(fetch)
+        self.assertEqual(errors, [])
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(len({id(result) for result in results}), 1)
+        self.assertIs(vitals_cache.get('patient', 60), results[0])
+
+    def test_waiters_receive_the_fetch_error(self):
+        release = threading.Event()
+
+        def fetch():
+            release.wait(5)
+            raise RuntimeError('google down')
+
+        threading.Timer(0.2, release.set).start()
+        results, errors = self.run_concurrently(fetch)
+        self.assertEqual(results, [])
+        self.assertEqual([str(e) for e in errors], ['google down'] * 5)
+        self.assertIsNone(vitals_cache.get('patient', 60))
+
+
+class SyncLockTests(QueryBudgetTestMixin, TransactionTestCase):
+    # Another worker process is stood in for by a thread with its own
+    # database connection holding the patient's sync lock.
+    def setUp(self):
+        vitals_cache.clear()
+        self.patient = Patient.objects.create(first_name='Pat', last_name='Lock', email='lock@example.com')
+        UserVitals.objects.create(patient=self.patient, steps=1000)
+        UserVitals.objects.filter(patient=self.patient).update(updated_at=timezone.now() - timedelta(days=1))
+        UserCredentials.objects.create(
+            patient=self.patient, access_token='token', refresh_token='refresh',
+            token_uri='https://oauth2.googleapis.com/token', client_id='id', client_secret='secret',
+            scopes=[], expires_at=timezone.now() + timedelta(hours=1)
+        )
+        self.locked = threading.Event()
+        self.release = threading.Event()
+
+    def hold_lock(self, before_release=None):
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_lock(%s)', [self.patient.pk])
+                self.locked.set()
+                self.release.wait(5)
+                if before_release is not None:
+                    before_release(cursor)
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [self.patient.pk])
+        finally:
+            connection.close()
+
+    def start_holder(self, before_release=None):
+        holder = threading.Thread(target=self.hold_lock, args=(before_release,))
+        holder.start()
+        self.addCleanup(holder.join)
+        self.addCleanup(self.release.set)
+        self.locked.wait(5)
+
+    def fetch(self):
+        return self.client.get('/vitals/health_data/', **self.auth_headers(self.patient))
+
+    def test_waits_for_the_other_sync_and_reads_its_row(self):
+        def finish_sync(cursor):
+            # Wait until the request is queued behind the lock, then "sync".
+            while True:
+                cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory' AND NOT granted")
+                if cursor.fetchone()[0]:
+                    break
+                time.sleep(0.01)
+            UserVitals.objects.filter(patient=self.patient).update(steps=2000, updated_at=timezone.now())
+
+        self.start_holder(finish_sync)
+        self.release.set()
+        with mock.patch('UserVitals.sync.sync_patient') as sync:
+            response = self.fetch()
+        self.assertEqual(response.status_code, 200, response.content)
+        self.assertEqual(response.json()['steps'], 2000)
+        sync.assert_not_called()
+
+    def test_times_out_while_another_process_syncs(self):
+        self.start_holder()
+        with self.settings(VITALS_SYNC_WAIT_TIMEOUT=0.2), mock.patch('UserVitals.sync.sync_patient') as sync:
+            response = self.fetch()
+        self.assertEqual(response.status_code, 504)
+        sync.assert_not_called()
+
+    def test_lock_is_released_after_the_sync(self):
+        with mock.patch('UserVitals.sync.sync_patient') as sync:
+            sync.return_value = UserVitals.objects.get(patient=self.patient)
+            self.assertEqual(self.fetch().status_code, 200)
+        sync.assert_called_once()
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT count(*) FROM pg_locks WHERE locktype = 'advisory'")
+            self.assertEqual(cursor.fetchone()[0], 0)
+
+
+class QueryBudgetCoverageTests(SimpleTestCase):
+    def test_every_api_view_declares_a_budget(self):
+        missing = [
+            name for name, view in routed_views()
+            if view.__module__.split('.')[0] in ('Users', 'UserVitals', 'youtube_videos')
+            and not has_query_budget(view)
+        ]
+        self.assertEqual(missing, [])
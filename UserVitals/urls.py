@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import fetch_data,Ai_pred
+from .views import fetch_data,Ai_pred,doctor_dashboard,ingest_bpm,export_bpm
 
 urlpatterns = [
     path('health_data/', fetch_data, name='health_data'),
-    path('AI/',Ai_pred,name = 'AI_prediction')
+    path('AI/',Ai_pred,name = 'AI_prediction'),
+    path('dashboard/', doctor_dashboard, name='doctor_dashboard'),
+    path('bpm/ingest/', ingest_bpm, name='ingest_bpm'),
+    path('bpm/export/', export_bpm, name='export_bpm')
 ]
\ No newline at end of file
@@ -1,115 +1,94 @@
-import time
+import csv
+import json
 import requests
-
-from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef,Subquery
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from googleapiclient.errors import HttpError
 
 
-from rest_framework.decorators import api_view,permission_classes
+from rest_framework.decorators import api_view,permission_classes,parser_classes
 from rest_framework import status
+from rest_framework.parsers import JSONParser
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 
+from HeartAI.pagination import EmailPagination
+from HeartAI.query_budget import query_budget
 from Users.models import Patient,Doctor
 from .models import UserVitals,UserBPM
+from . import vitals_cache
+from .sync import sync_stale_patient
+from .predictors import PredictionError,get_predictor
+from .parsers import NDJSONParser
 
 
+@query_budget(25)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def fetch_data(request):
-    user = request.user
-    
-    if isinstance(user,Doctor):
-        patient_email = request.query_params.get('email')
+    user, error = resolve_patient(request)
+    if error is not None:
+        return error
 
-        if not patient_email:
-            return Response(
-                {'error': 'Patient email is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        try:
-            patient_intended = Patient.objects.get(email = patient_email)
-            if ValidateDoctorToPatient(user,patient_intended):
-                return Response(
-                {
-                    'error':"User Not Assigned to this Doctor"
-                },
-                status=status.HTTP_403_FORBIDDEN
-            )
-            user = patient_intended
-
-        except Patient.DoesNotExist:
-            return Response(
-                {
-                    'error':"User Doesn't exist"
-                },
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-    if not hasattr(user, 'credentials') or user.credentials is None:
+    # Callers may accept data up to ?max_age= seconds old; the default is
+    # VITALS_MAX_AGE and anything below VITALS_MIN_AGE is raised to it.
+    max_age = request.query_params.get('max_age', settings.VITALS_MAX_AGE)
+    try:
+        max_age = int(max_age)
+    except (TypeError, ValueError):
+        max_age = -1
+    if max_age < 0:
         return Response(
-            {'error': 'User credentials not found'},
+            {'error': 'max_age must be a non-negative number of seconds'},
             status=status.HTTP_400_BAD_REQUEST
         )
-            
-    credentials = user.credentials
-
-    user_credentials = Credentials(
-            token=credentials.access_token,
-            refresh_token=credentials.refresh_token,
-            token_uri=credentials.token_uri,
-            client_id=credentials.client_id,
-            client_secret=credentials.client_secret,
-            scopes=credentials.scopes
-        )
-    try:
-        
-        service = build('fitness', 'v1', credentials=user_credentials)
-
-        now = int(time.time() * 1000)
-        start_time = now - (24 * 60 * 60 * 1000)
-        dataset_id = f"{start_time}-{now}"
-
-        activity_data = fetch_activity_data(service, dataset_id)
+    max_age = max(max_age, settings.VITALS_MIN_AGE)
 
-        blood_pressure_data = fetch_blood_pressure_data(service, dataset_id)
-
-        heart_rate_data = fetch_heart_rate_data(service, dataset_id)
+    user_vitals = vitals_cache.get(user.pk, max_age)
+    if user_vitals is not None:
+        return Response(
+            serialize_vitals(user_vitals),
+            status=status.HTTP_200_OK
+        )
 
-        oxygen_saturation_data = fetch_oxygen_saturation_data(service, dataset_id)
+    # The sync_vitals worker keeps UserVitals current; only fall back to
+    # Google when the stored row is missing or older than max_age.
+    fresh_after = timezone.now() - timedelta(seconds=max_age)
+    user_vitals = UserVitals.objects.filter(patient = user, updated_at__gte = fresh_after).first()
+    if user_vitals is not None:
+        vitals_cache.store(user.pk, user_vitals)
+        return Response(
+            serialize_vitals(user_vitals),
+            status=status.HTTP_200_OK
+        )
 
-        UserVitals.objects.update_or_create(
-            patient = user,
-            defaults={
-            'steps': activity_data['step_count'],
-            'calories': activity_data['calories'],
-            'systolic_blood_pressure': blood_pressure_data['systolic'],
-            'diastolic_blood_pressure': blood_pressure_data['diastolic'],
-            'heart_rate' : heart_rate_data,
-            'oxygen_sat' : oxygen_saturation_data
-            }
+    if not hasattr(user, 'credentials') or user.credentials is None:
+        return Response(
+            {'error': 'User credentials not found'},
+            status=status.HTTP_400_BAD_REQUEST
         )
 
-        if heart_rate_data is not None:
-            UserBPM.objects.create(
-                patient = user,
-                heart_rate = heart_rate_data
-            )
-        
+    try:
+        # Concurrent requests for the same patient share one sync: threads
+        # of this process wait on the single flight, other processes on the
+        # patient's sync lock.
+        user_vitals = vitals_cache.single_flight(user.pk, lambda: sync_stale_patient(user, fresh_after))
 
         return Response(
-            {
-            'steps': activity_data['step_count'],
-            'calories': activity_data['calories'],
-            'systolic_blood_pressure': blood_pressure_data['systolic'],
-            'diastolic_blood_pressure': blood_pressure_data['diastolic'],
-            'heart_rate' : heart_rate_data,
-            'oxygen_sat' : oxygen_saturation_data
-            },
+            serialize_vitals(user_vitals),
             status=status.HTTP_200_OK
         )
+    except vitals_cache.SyncWaitTimeout:
+        return Response(
+            {'error': 'Timed out waiting for Google Fit sync'},
+            status=status.HTTP_504_GATEWAY_TIMEOUT
+        )
     except HttpError as e:
         if e.resp.status == 401:
             return Response(
@@ -127,152 +106,43 @@ def fetch_data(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
-def fetch_activity_data(service, dataset_id):
-    step_count_data = service.users().dataSources().datasets().get(
-        userId='me',
-        dataSourceId='derived:com.google.step_count.delta:com.google.android.gms:estimated_steps',
-        datasetId=dataset_id
-    ).execute()
-
-    calories_data = service.users().dataSources().datasets().get(
-        userId='me',
-        dataSourceId='derived:com.google.calories.expended:com.google.android.gms:merge_calories_expended',
-        datasetId=dataset_id
-    ).execute()
-
-    total_steps = 0
-    for point in step_count_data.get('point', []):
-        value = point.get('value', [{}])[0]
-        total_steps += value.get('intVal', 0)
-
-    total_calories = 0.0
-    for point in calories_data.get('point', []):
-        value = point.get('value', [{}])[0]
-        total_calories += value.get('fpVal', 0.0)
-
-    return {
-        'step_count': total_steps,
-        'calories': total_calories,
-    }
-
-def fetch_blood_pressure_data(service, dataset_id):
-    blood_pressure_data = service.users().dataSources().datasets().get(
-        userId='me',
-        dataSourceId='derived:com.google.blood_pressure:com.google.android.gms:merged',
-        datasetId=dataset_id
-    ).execute()
-
-    points = blood_pressure_data.get('point', [])
-    if not points:
-        return {'systolic': None, 'diastolic': None}
-
-    point = points[-1]
-    values = point.get('value', [])
-
-    systolic = values[0].get('fpVal') 
-    diastolic = values[1].get('fpVal') 
-    return {
-        'systolic': systolic,
-        'diastolic': diastolic
-    }
-
-def fetch_heart_rate_data(service, dataset_id):
-    heart_rate_data = service.users().dataSources().datasets().get(
-        userId='me',
-        dataSourceId='derived:com.google.heart_rate.bpm:com.google.android.gms:merge_heart_rate_bpm',
-        datasetId=dataset_id
-    ).execute()
-
-    points = heart_rate_data.get('point', [])
-    if not points:
-        return None 
-    
-    total_bpm = 0.0
-    count = 0
-    for point in points:
-        value = point.get('value', [{}])[0]
-        bpm = value.get('fpVal')
-        if bpm is not None:
-            total_bpm += bpm
-            count += 1
-
-    if count > 0:
-        return total_bpm / count
-    return None
-
-def fetch_oxygen_saturation_data(service, dataset_id):
-    oxygen_saturation_data = service.users().dataSources().datasets().get(
-        userId='me',
-        dataSourceId='derived:com.google.oxygen_saturation:com.google.android.gms:merged',
-        datasetId=dataset_id
-    ).execute()
-
-    points = oxygen_saturation_data.get('point', [])
-    if not points:
-        return None 
-
-    latest_point = points[-1]
-    values = latest_point.get('value', [])
-
-    oxygen_saturation = None
-    if values:
-        oxygen_saturation = values[0].get('fpVal')
-
-    return oxygen_saturation
-
+@query_budget(3)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def Ai_pred(request):
-    user = request.user
-    
-    if isinstance(user,Doctor):
-        patient_email = request.query_params.get('email')
-        if not patient_email:
-            return Response(
-                {'error': 'Patient email is required'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        try:
-            patient_intended = Patient.objects.get(email = patient_email)
-            if ValidateDoctorToPatient(user,patient_intended):
-                return Response(
-                {
-                    'error':"User Not Assigned to this Doctor"
-                },
-                status=status.HTTP_403_FORBIDDEN
-            )
-            user = patient_intended
-
-        except Patient.DoesNotExist:
-            return Response(
-                {
-                    'error':"User Doesn't exist"
-                },
-                status=status.HTTP_404_NOT_FOUND
-            )
-
-    bpm_readings = UserBPM.objects.filter(patient = user).values('heart_rate')
-    bpm_readings_list = list(bpm_readings)
+    user, error = resolve_patient(request)
+    if error is not None:
+        return error
+
+    # Only the most recent readings are sent, newest first from the
+    # (patient, recorded_at) index and then put back in time order.
+    window_start = timezone.now() - timedelta(hours=settings.AI_PRED_WINDOW_HOURS)
+    bpm_readings = list(
+        UserBPM.objects.filter(
+            patient = user,
+            recorded_at__gte = window_start,
+            heart_rate__isnull = False
+        ).order_by('-recorded_at','-id').values_list('id','heart_rate')[:settings.AI_PRED_MAX_READINGS]
+    )
 
-    if not bpm_readings_list:
+    if not bpm_readings:
         return Response(
             {'error': 'No heart rate data available for prediction'},
             status=status.HTTP_404_NOT_FOUND
         )
-    
-    api_url = "https://sharafo-InnovatorsHeartAI.hf.space/predict"
 
-    data ={
-        'heartbeat':bpm_readings_list
-    }
+    predictor = get_predictor()
+
+    # A prediction only changes when a new reading arrives.
+    cache_key = f"ai_pred:{predictor.name}:{user.pk}:{bpm_readings[0][0]}"
+    prediction = cache.get(cache_key)
+    if prediction is not None:
+        return Response(prediction,status=status.HTTP_200_OK)
+
+    heartbeat = [heart_rate for _, heart_rate in reversed(bpm_readings)]
     try:
-        response = requests.post(
-                api_url, 
-                json=data, 
-                timeout=10
-            )
-        response.raise_for_status()
-        prediction = response.json()
+        prediction = predictor.predict(heartbeat)
+        cache.set(cache_key, prediction, settings.AI_PRED_CACHE_TTL)
         return Response(prediction,status=status.HTTP_200_OK)
     
     except requests.exceptions.Timeout:
@@ -290,7 +160,193 @@ def Ai_pred(request):
             {'error': 'Invalid response from AI prediction service'},
             status=status.HTTP_502_BAD_GATEWAY
         )
+    except PredictionError as e:
+        return Response(
+            {'error': f'AI prediction error: {str(e)}'},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     
-def ValidateDoctorToPatient(doctor,patient)-> bool:
-    return doctor == patient.doctor
+@query_budget(2)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def doctor_dashboard(request):
+    user = request.user
+
+    if not isinstance(user,Doctor):
+        return Response(
+            {"error": "Only doctors can access the dashboard"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    # One query per page: vitals are joined in and the latest BPM reading is
+    # a correlated subquery on the (patient, recorded_at) index.
+    latest_bpm = UserBPM.objects.filter(
+        patient = OuterRef('pk'),
+        heart_rate__isnull = False
+    ).order_by('-recorded_at','-id')
+
+    patients = Patient.objects.filter(doctor = user).select_related('vitals').annotate(
+        latest_bpm = Subquery(latest_bpm.values('heart_rate')[:1]),
+        latest_bpm_at = Subquery(latest_bpm.values('recorded_at')[:1])
+    )
+
+    paginator = EmailPagination()
+    page = paginator.paginate_queryset(patients, request)
+
+    dashboard = [
+        {
+            'full_name': patient.full_name,
+            'email': patient.email,
+            'vitals': serialize_vitals(patient.vitals) if hasattr(patient, 'vitals') else None,
+            'latest_bpm': {
+                'heart_rate': patient.latest_bpm,
+                'recorded_at': patient.latest_bpm_at
+            } if patient.latest_bpm_at is not None else None
+        } for patient in page]
+
+    return paginator.get_paginated_response(dashboard)
+
+@query_budget(None)
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([JSONParser,NDJSONParser])
+def ingest_bpm(request):
+    user = request.user
+
+    if not isinstance(user,Patient):
+        return Response(
+            {'error': 'Only Patients can upload heart rate readings'},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    readings = request.data
+    if not isinstance(readings, list):
+        return Response(
+            {'error': 'Expected a JSON array or NDJSON of readings'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if len(readings) > settings.BPM_INGEST_MAX_BATCH:
+        return Response(
+            {'error': f'A batch can hold at most {settings.BPM_INGEST_MAX_BATCH} readings'},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+
+    # NumPy is only needed here, so it is imported on first upload.
+    from .ingest import ingest_readings
+
+    return Response(
+        ingest_readings(user, readings),
+        status=status.HTTP_201_CREATED
+    )
+
+EXPORT_FORMATS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+
+@query_budget(3)
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def export_bpm(request):
+    # GET /vitals/bpm/export/?output=csv|ndjson&start=<ISO 8601>&end=<ISO 8601>
+    # Doctors pass ?email= for one of their patients.
+    patient, error = resolve_patient(request)
+    if error is not None:
+        return error
+
+    output = request.query_params.get('output', 'csv')
+    if output not in EXPORT_FORMATS:
+        return Response(
+            {'error': f"output must be one of {', '.join(EXPORT_FORMATS)}"},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    readings = UserBPM.objects.filter(patient = patient, heart_rate__isnull = False)
+    for param, lookup in (('start', 'recorded_at__gte'), ('end', 'recorded_at__lt')):
+        value = request.query_params.get(param)
+        if value is None:
+            continue
+        try:
+            moment = parse_datetime(value)
+        except ValueError:
+            moment = None
+        if moment is None:
+            return Response(
+                {'error': f'{param} must be an ISO 8601 datetime'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if timezone.is_naive(moment):
+            moment = moment.replace(tzinfo=dt_timezone.utc)
+        readings = readings.filter(**{lookup: moment})
+
+    # iterator() reads through a server-side cursor in chunks, so memory
+    # stays flat no matter how much history is exported.
+    rows = readings.order_by('recorded_at','id').values_list('recorded_at','heart_rate').iterator(
+        chunk_size=settings.BPM_EXPORT_CHUNK_SIZE
+    )
+    lines = export_csv(rows) if output == 'csv' else export_ndjson(rows)
+
+    response = StreamingHttpResponse(lines, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="heart_rate.{output}"'
+    return response
+
+
+class Echo:
+    def write(self, value):
+        return value
+
+
+def export_csv(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(['recorded_at', 'heart_rate'])
+    for recorded_at, heart_rate in rows:
+        yield writer.writerow([recorded_at.isoformat(), heart_rate])
+
+
+def export_ndjson(rows):
+    for recorded_at, heart_rate in rows:
+        yield json.dumps({'recorded_at': recorded_at.isoformat(), 'heart_rate': heart_rate}) + '\n'
+
+
+def resolve_patient(request):
+    # Patients read their own data; doctors name one of their patients with ?email=.
+    user = request.user
+    if not isinstance(user,Doctor):
+        return user, None
+
+    patient_email = request.query_params.get('email')
+    if not patient_email:
+        return None, Response(
+            {'error': 'Patient email is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    try:
+        patient = Patient.objects.get(email = patient_email)
+    except Patient.DoesNotExist:
+        return None, Response(
+            {'error': "User Doesn't exist"},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    if patient.doctor_id != user.pk:
+        return None, Response(
+            {'error': "User Not Assigned to this Doctor"},
+            status=status.HTTP_403_FORBIDDEN
+        )
+
+    return patient, None
+
+def serialize_vitals(user_vitals):
+    return {
+        'steps': user_vitals.steps,
+        'calories': user_vitals.calories,
+        'systolic_blood_pressure': user_vitals.systolic_blood_pressure,
+        'diastolic_blood_pressure': user_vitals.diastolic_blood_pressure,
+        'heart_rate': user_vitals.heart_rate,
+        'oxygen_sat': user_vitals.oxygen_sat,
+        'updated_at': user_vitals.updated_at
+    }
 
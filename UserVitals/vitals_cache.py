@@ -0,0 +1,85 @@
+import threading
+from datetime import timedelta
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils import timezone
+
+
+# Latest UserVitals row per patient, kept in process memory so repeated polls
+# skip the database. The TTL bounds how long a row written by another
+# process (e.g. the sync_vitals worker) can go unnoticed here.
+_entries = None
+_flights = {}
+_lock = threading.Lock()
+
+
+class SyncWaitTimeout(Exception):
+    pass
+
+
+class _Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def _cache():
+    global _entries
+    if _entries is None:
+        _entries = TTLCache(maxsize=settings.VITALS_CACHE_SIZE, ttl=settings.VITALS_CACHE_TTL)
+    return _entries
+
+
+def get(patient_id, max_age):
+    # Returns the cached row if it was updated within the last `max_age`
+    # seconds, otherwise None.
+    with _lock:
+        user_vitals = _cache().get(patient_id)
+    if user_vitals is None or user_vitals.updated_at is None:
+        return None
+    if user_vitals.updated_at < timezone.now() - timedelta(seconds=max_age):
+        return None
+    return user_vitals
+
+
+def store(patient_id, user_vitals):
+    with _lock:
+        _cache()[patient_id] = user_vitals
+    return user_vitals
+
+
+def clear():
+    with _lock:
+        _cache().clear()
+
+
+def single_flight(patient_id, fetch):
+    # The first caller for a patient runs fetch(); callers arriving while it
+    # is in flight wait for it and share its result or exception instead of
+    # calling Google again. Coalescing is per process; sync.sync_lock
+    # serialises the leaders of different processes.
+    with _lock:
+        flight = _flights.get(patient_id)
+        leader = flight is None
+        if leader:
+            flight = _flights[patient_id] = _Flight()
+
+    if not leader:
+        if not flight.done.wait(settings.VITALS_SYNC_WAIT_TIMEOUT):
+            raise SyncWaitTimeout(f"Timed out waiting for the vitals sync of patient {patient_id}")
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    try:
+        flight.result = store(patient_id, fetch())
+        return flight.result
+    except Exception as e:
+        flight.error = e
+        raise
+    finally:
+        with _lock:
+            del _flights[patient_id]
+        flight.done.set()
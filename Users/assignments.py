@@ -0,0 +1,66 @@
+from django.db import IntegrityError, connection, transaction
+
+from .authentication import invalidate_user
+from .models import AssignmentRequest,Patient
+
+
+ACTION_STATUS = {
+    'accept': 'accepted',
+    'reject': 'rejected',
+}
+
+
+class DuplicateRequest(Exception):
+    pass
+
+
+def create_request(patient, doctor):
+    # The partial unique index on pending (patient, doctor) rejects a second
+    # pending request, so two concurrent submissions cannot both succeed.
+    try:
+        with transaction.atomic():
+            return AssignmentRequest.objects.create(patient=patient, doctor=doctor)
+    except IntegrityError as e:
+        raise DuplicateRequest("You already have a pending request to this doctor") from e
+
+
+def respond(doctor, request_ids, action):
+    # One conditional UPDATE flips the doctor's still-pending requests among
+    # `request_ids`; the status check in its WHERE clause is re-evaluated
+    # after a concurrent update, so a request is only ever answered once. On
+    # accept, the rows it returns drive the Patient update in the same
+    # statement. Returns the ids that were processed; requests that are not
+    # pending or belong to another doctor are left untouched.
+    request_ids = list(dict.fromkeys(request_ids))
+    if not request_ids:
+        return []
+
+    qn = connection.ops.quote_name
+    requests_table = qn(AssignmentRequest._meta.db_table)
+    patients_table = qn(Patient._meta.db_table)
+    update_requests = (
+        f"UPDATE {requests_table} SET {qn('status')} = %s "
+        f"WHERE {qn('id')} IN ({', '.join(['%s'] * len(request_ids))}) "
+        f"AND {qn('doctor_id')} = %s AND {qn('status')} = 'pending' "
+        f"RETURNING {qn('id')}, {qn('patient_id')}"
+    )
+    params = [ACTION_STATUS[action], *request_ids, doctor.pk]
+
+    with connection.cursor() as cursor:
+        if action == 'accept':
+            cursor.execute(
+                f"WITH responded AS ({update_requests}) "
+                f"UPDATE {patients_table} SET {qn('doctor_id')} = %s FROM responded "
+                f"WHERE {patients_table}.{qn('id')} = responded.{qn('patient_id')} "
+                f"RETURNING responded.{qn('id')}, {patients_table}.{qn('email')}",
+                [*params, doctor.pk]
+            )
+        else:
+            cursor.execute(update_requests, params)
+        rows = cursor.fetchall()
+
+    if action == 'accept':
+        # The raw UPDATE skips post_save, so evict the cached rows here.
+        for _, patient_email in rows:
+            invalidate_user('patient', patient_email)
+    return sorted(request_id for request_id, _ in rows)
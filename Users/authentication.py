@@ -0,0 +1,86 @@
+import copy
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed,InvalidToken
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from .models import Doctor,Patient
+
+
+# Tokens identify the account by these claims rather than simplejwt's
+# `user_id`, which it would otherwise resolve against auth.User.
+ROLE_CLAIM = 'role'
+EMAIL_CLAIM = 'email'
+
+ROLES = {
+    'doctor': Doctor,
+    'patient': Patient,
+}
+
+_users = None
+_lock = threading.Lock()
+
+
+def _cache():
+    global _users
+    if _users is None:
+        _users = TTLCache(maxsize=settings.AUTH_USER_CACHE_SIZE, ttl=settings.AUTH_USER_CACHE_TTL)
+    return _users
+
+
+def role_for(user):
+    for role, model in ROLES.items():
+        if isinstance(user, model):
+            return role
+    raise ValueError(f"Cannot issue tokens for {type(user).__name__}")
+
+
+def tokens_for(user):
+    refresh = RefreshToken()
+    refresh[EMAIL_CLAIM] = user.email
+    refresh[ROLE_CLAIM] = role_for(user)
+    return refresh
+
+
+def get_user(role, email):
+    key = (role, email)
+    with _lock:
+        user = _cache().get(key)
+    if user is None:
+        user = ROLES[role].objects.get(email = email)
+        with _lock:
+            _cache()[key] = user
+    # Each request gets its own copy so per-request state (related objects
+    # cached on the instance, attribute changes) never leaks between requests.
+    return copy.copy(user)
+
+
+def invalidate_user(role, email):
+    with _lock:
+        _cache().pop((role, email), None)
+
+
+def clear_user_cache():
+    with _lock:
+        _cache().clear()
+
+
+class RoleJWTAuthentication(JWTAuthentication):
+    # Resolves the Doctor or Patient named by the token's role and email
+    # claims from a short-lived per-process cache instead of querying the
+    # database on every request.
+
+    def get_user(self, validated_token):
+        role = validated_token.get(ROLE_CLAIM)
+        email = validated_token.get(EMAIL_CLAIM)
+        if role not in ROLES or not email:
+            raise InvalidToken(_("Token contained no recognizable user identification"))
+
+        try:
+            return get_user(role, email)
+        except ROLES[role].DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
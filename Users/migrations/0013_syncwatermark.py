@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:08
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0012_doctor_auth_method_patient_auth_method_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SyncWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_source', models.CharField(max_length=255)),
+                ('synced_until', models.BigIntegerField()),
+                ('state', models.JSONField(default=dict)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('patient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='sync_watermarks', to='Users.patient')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('patient', 'data_source'), name='unique_sync_watermark_per_source')],
+            },
+        ),
+    ]
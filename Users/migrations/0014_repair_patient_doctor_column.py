@@ -0,0 +1,53 @@
+from django.db import migrations
+
+
+def repair_patient_doctor_column(apps, schema_editor):
+    # 0005/0008 moved Doctor's primary key from `id` to `email`, but on
+    # PostgreSQL Users_patient.doctor_id was left as a bigint without a
+    # foreign key, so no doctor could ever be assigned. Bring the column in
+    # line with the model if it is still in that state.
+    #
+    # DATA LOSS: any value still in the bigint column is an old Doctor.id,
+    # and that column was dropped by 0005, so it cannot be mapped to a
+    # doctor's email. Casting would keep numbers that violate the new
+    # foreign key, so those assignments are cleared instead. Patients have to
+    # be reassigned through assignment requests.
+    #
+    # SQLite rebuilds referencing tables when a primary key changes type, so
+    # only PostgreSQL can be left in this state.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT data_type FROM information_schema.columns "
+            "WHERE table_name = 'Users_patient' AND column_name = 'doctor_id'"
+        )
+        row = cursor.fetchone()
+
+    if row is None or row[0] != 'bigint':
+        return
+
+    schema_editor.execute(
+        'ALTER TABLE "Users_patient" ALTER COLUMN "doctor_id" TYPE varchar(254) USING NULL'
+    )
+    schema_editor.execute(
+        'ALTER TABLE "Users_patient" ADD CONSTRAINT "Users_patient_doctor_id_fk_Users_doctor_email" '
+        'FOREIGN KEY ("doctor_id") REFERENCES "Users_doctor" ("email") DEFERRABLE INITIALLY DEFERRED'
+    )
+    schema_editor.execute(
+        'CREATE INDEX "Users_patient_doctor_id_like" ON "Users_patient" ("doctor_id" varchar_pattern_ops)'
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0013_syncwatermark'),
+    ]
+
+    operations = [
+        # Reversing is a no-op on purpose: the repaired column is what every
+        # earlier migration state already describes.
+        migrations.RunPython(repair_patient_doctor_column, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-18 08:32
+
+from django.db import migrations, models
+from django.db.models import Min
+
+
+def reject_duplicate_pending_requests(apps, schema_editor):
+    # Before the unique constraint existed, create_request could race and
+    # leave several pending requests for the same patient and doctor. Keep
+    # the oldest of each and mark the rest rejected so the index can build.
+    AssignmentRequest = apps.get_model('Users', 'AssignmentRequest')
+    pending = AssignmentRequest.objects.filter(status='pending')
+    keep = pending.values('patient', 'doctor').annotate(first_id=Min('id')).values('first_id')
+    duplicates = pending.exclude(id__in=keep)
+    duplicates.update(status='rejected')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0014_repair_patient_doctor_column'),
+    ]
+
+    operations = [
+        migrations.RunPython(reject_duplicate_pending_requests, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='assignmentrequest',
+            index=models.Index(fields=['doctor', 'status'], name='assignment_doctor_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='assignmentrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('patient', 'doctor'), name='unique_pending_assignment_request'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Step 1 of 4 moving Doctor and Patient from email primary keys to bigint
+# ids (then UserVitals 0009, Users 0017, UserVitals 0010). Adds and fills
+# the new id columns plus a bigint shadow of every foreign key in this app.
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+BATCH_SIZE = 1000
+
+# (model, foreign key, referenced model)
+FOREIGN_KEYS = [
+    ('Patient', 'doctor', 'Doctor'),
+    ('AssignmentRequest', 'patient', 'Patient'),
+    ('AssignmentRequest', 'doctor', 'Doctor'),
+    ('UserCredentials', 'patient', 'Patient'),
+    ('SyncWatermark', 'patient', 'Patient'),
+]
+
+
+def number_rows(apps, schema_editor):
+    for model_name in ('Doctor', 'Patient'):
+        model = apps.get_model('Users', model_name)
+        rows = list(model.objects.order_by('email').only('email'))
+        for number, row in enumerate(rows, 1):
+            row.id = number
+        model.objects.bulk_update(rows, ['id'], batch_size=BATCH_SIZE)
+
+
+def fill_keys(apps, schema_editor):
+    for model_name, field, target_name in FOREIGN_KEYS:
+        model = apps.get_model('Users', model_name)
+        target = apps.get_model('Users', target_name)
+        model.objects.update(**{
+            f'{field}_key': Subquery(target.objects.filter(email=OuterRef(f'{field}_id')).values('id')[:1])
+        })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0015_assignmentrequest_pending_constraints'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='doctor',
+            name='id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='patient',
+            name='id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.RunPython(number_rows, migrations.RunPython.noop),
+    ] + [
+        migrations.AddField(
+            model_name=model_name.lower(),
+            name=f'{field}_key',
+            field=models.BigIntegerField(null=True),
+        )
+        for model_name, field, target_name in FOREIGN_KEYS
+    ] + [
+        migrations.RunPython(fill_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,236 @@
+# Step 3 of 4 (see 0016). With every email foreign key gone, makes the new
+# ids the primary keys, keeps email as a unique column and turns the bigint
+# shadow columns in this app back into foreign keys. Every step reverses,
+# so the whole chain can be unapplied with data in the tables.
+
+import django.db.models.deletion
+from django.db import NotSupportedError, migrations, models
+from django.core.management.color import no_style
+from django.db.models import OuterRef, Subquery
+
+
+# (model, foreign key, referenced model), as in 0016.
+FOREIGN_KEYS = [
+    ('Patient', 'doctor', 'Doctor'),
+    ('AssignmentRequest', 'patient', 'Patient'),
+    ('AssignmentRequest', 'doctor', 'Doctor'),
+    ('UserCredentials', 'patient', 'Patient'),
+    ('SyncWatermark', 'patient', 'Patient'),
+]
+
+
+def restore_email_keys(apps, schema_editor):
+    # Reverse only: refills the re-added email foreign keys from the shadow
+    # columns before they become NOT NULL again.
+    for model_name, field, target_name in FOREIGN_KEYS:
+        model = apps.get_model('Users', model_name)
+        target = apps.get_model('Users', target_name)
+        model.objects.update(**{
+            f'{field}_id': Subquery(target.objects.filter(id=OuterRef(f'{field}_key')).values('email')[:1])
+        })
+
+
+def reset_id_sequences(apps, schema_editor):
+    # The id columns were filled by 0016, so the new sequences must start
+    # after the highest existing id.
+    surrogate_models = [apps.get_model('Users', 'Doctor'), apps.get_model('Users', 'Patient')]
+    statements = schema_editor.connection.ops.sequence_reset_sql(no_style(), surrogate_models)
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def primary_key_name(schema_editor, table):
+    connection = schema_editor.connection
+    with connection.cursor() as cursor:
+        constraints = connection.introspection.get_constraints(cursor, table)
+    names = [name for name, constraint in constraints.items() if constraint['primary_key']]
+    if len(names) != 1:
+        raise ValueError(f"Expected one primary key on {table}, found {names}")
+    return names[0]
+
+
+def email_tables(apps, schema_editor):
+    # The primary key swap is written in PostgreSQL's DDL; earlier
+    # migrations in this app do not run elsewhere either.
+    if schema_editor.connection.vendor != 'postgresql':
+        raise NotSupportedError("The surrogate key migrations only support PostgreSQL")
+    return [apps.get_model('Users', model_name)._meta.db_table for model_name in ('Doctor', 'Patient')]
+
+
+def drop_email_primary_keys(apps, schema_editor):
+    # Postgres allows one primary key per table, so email's has to go before
+    # id takes over. Email stays unique through an explicit constraint.
+    qn = schema_editor.quote_name
+    for table in email_tables(apps, schema_editor):
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(primary_key_name(schema_editor, table))}"
+        )
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_email_uniq')} UNIQUE ({qn('email')})"
+        )
+
+
+def drop_id_primary_keys(apps, schema_editor):
+    # Reverse only: Django keeps a primary key when its field stops being
+    # one, so id's has to be dropped before the id AlterField is unapplied.
+    qn = schema_editor.quote_name
+    for table in email_tables(apps, schema_editor):
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(primary_key_name(schema_editor, table))}"
+        )
+
+
+def restore_email_primary_keys(apps, schema_editor):
+    qn = schema_editor.quote_name
+    for table in email_tables(apps, schema_editor):
+        schema_editor.execute(f"ALTER TABLE {qn(table)} DROP CONSTRAINT {qn(f'{table}_email_uniq')}")
+        schema_editor.execute(
+            f"ALTER TABLE {qn(table)} ADD CONSTRAINT {qn(f'{table}_pkey')} PRIMARY KEY ({qn('email')})"
+        )
+
+
+def detach_foreign_key(model_name, name, field):
+    # Makes the email foreign key nullable before it is dropped, so that
+    # unapplying can add it back to a populated table.
+    nullable = field.clone()
+    nullable.null = True
+    return migrations.AlterField(
+        model_name=model_name,
+        name=name,
+        field=nullable,
+    )
+
+
+def surrogate_primary_key(model_name):
+    return [
+        migrations.AlterField(
+            model_name=model_name,
+            name='id',
+            field=models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID'),
+        ),
+        # The database side was done by drop_email_primary_keys.
+        migrations.SeparateDatabaseAndState(state_operations=[
+            migrations.AlterField(
+                model_name=model_name,
+                name='email',
+                field=models.EmailField(max_length=254, unique=True),
+            ),
+        ]),
+    ]
+
+
+def restore_foreign_key(model_name, name, field):
+    # The shadow column becomes a nullable foreign key, takes the field's
+    # name and column, then gets its final definition.
+    nullable = field.clone()
+    nullable.null = True
+    return [
+        migrations.AlterField(
+            model_name=model_name,
+            name=f'{name}_key',
+            field=nullable,
+        ),
+        migrations.RenameField(
+            model_name=model_name,
+            old_name=f'{name}_key',
+            new_name=name,
+        ),
+        migrations.AlterField(
+            model_name=model_name,
+            name=name,
+            field=field,
+        ),
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Users', '0016_surrogate_keys_expand'),
+        ('UserVitals', '0009_patient_key_expand'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='assignmentrequest',
+            name='unique_pending_assignment_request',
+        ),
+        migrations.RemoveIndex(
+            model_name='assignmentrequest',
+            name='assignment_doctor_status_idx',
+        ),
+        migrations.RemoveConstraint(
+            model_name='syncwatermark',
+            name='unique_sync_watermark_per_source',
+        ),
+        detach_foreign_key('assignmentrequest', 'patient', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, to='Users.patient'
+        )),
+        detach_foreign_key('assignmentrequest', 'doctor', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, to='Users.doctor'
+        )),
+        detach_foreign_key('usercredentials', 'patient', models.OneToOneField(
+            on_delete=django.db.models.deletion.CASCADE, related_name='credentials', to='Users.patient'
+        )),
+        detach_foreign_key('syncwatermark', 'patient', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, related_name='sync_watermarks', to='Users.patient'
+        )),
+        migrations.RunPython(migrations.RunPython.noop, restore_email_keys),
+        migrations.RemoveField(
+            model_name='patient',
+            name='doctor',
+        ),
+        migrations.RemoveField(
+            model_name='assignmentrequest',
+            name='patient',
+        ),
+        migrations.RemoveField(
+            model_name='assignmentrequest',
+            name='doctor',
+        ),
+        migrations.RemoveField(
+            model_name='usercredentials',
+            name='patient',
+        ),
+        migrations.RemoveField(
+            model_name='syncwatermark',
+            name='patient',
+        ),
+        migrations.SeparateDatabaseAndState(database_operations=[
+            migrations.RunPython(drop_email_primary_keys, restore_email_primary_keys),
+        ]),
+        *surrogate_primary_key('doctor'),
+        *surrogate_primary_key('patient'),
+        migrations.SeparateDatabaseAndState(database_operations=[
+            migrations.RunPython(migrations.RunPython.noop, drop_id_primary_keys),
+        ]),
+        migrations.RunPython(reset_id_sequences, migrations.RunPython.noop),
+        *restore_foreign_key('patient', 'doctor', models.ForeignKey(
+            blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+            related_name='patients', to='Users.doctor'
+        )),
+        *restore_foreign_key('assignmentrequest', 'patient', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, to='Users.patient'
+        )),
+        *restore_foreign_key('assignmentrequest', 'doctor', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, to='Users.doctor'
+        )),
+        *restore_foreign_key('usercredentials', 'patient', models.OneToOneField(
+            on_delete=django.db.models.deletion.CASCADE, related_name='credentials', to='Users.patient'
+        )),
+        *restore_foreign_key('syncwatermark', 'patient', models.ForeignKey(
+            on_delete=django.db.models.deletion.CASCADE, related_name='sync_watermarks', to='Users.patient'
+        )),
+        migrations.AddConstraint(
+            model_name='syncwatermark',
+            constraint=models.UniqueConstraint(fields=('patient', 'data_source'), name='unique_sync_watermark_per_source'),
+        ),
+        migrations.AddIndex(
+            model_name='assignmentrequest',
+            index=models.Index(fields=['doctor', 'status'], name='assignment_doctor_status_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='assignmentrequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('patient', 'doctor'), name='unique_pending_assignment_request'),
+        ),
+    ]
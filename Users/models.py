@@ -3,10 +3,14 @@ from django.contrib.auth.hashers import make_password
 
 
 class Doctor(models.Model):
+    # Doctors and patients are request.user for JWT-authenticated requests.
+    is_authenticated = True
+    is_anonymous = False
+
     first_name = models.CharField(max_length = 100)
     last_name = models.CharField(max_length = 100)
     full_name = models.CharField(max_length=200,null=True)
-    email = models.EmailField(unique = True,primary_key = True)
+    email = models.EmailField(unique = True)
     password = models.CharField(max_length=128,null=True)
     specialization = models.CharField(max_length = 100,null=True)
     description = models.TextField(blank=True)
@@ -17,10 +21,13 @@ class Doctor(models.Model):
 )
 
 class Patient(models.Model):
+    is_authenticated = True
+    is_anonymous = False
+
     first_name = models.CharField(max_length = 100) 
     last_name = models.CharField(max_length = 100)
     full_name = models.CharField(max_length=200,null=True)
-    email = models.EmailField(unique = True,primary_key= True)
+    email = models.EmailField(unique = True)
     password = models.CharField(max_length=128,null=True)
     doctor = models.ForeignKey(
         Doctor,
@@ -43,6 +50,18 @@ class AssignmentRequest(models.Model):
     doctor = models.ForeignKey(Doctor,on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)  
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'doctor'],
+                condition=models.Q(status='pending'),
+                name='unique_pending_assignment_request'
+            )
+        ]
+        indexes = [
+            models.Index(fields=['doctor', 'status'], name='assignment_doctor_status_idx')
+        ]
+
 
 class UserCredentials(models.Model):
     patient = models.OneToOneField(
@@ -56,4 +75,22 @@ class UserCredentials(models.Model):
     client_secret = models.CharField(max_length=255)
     scopes = models.JSONField()  
     expires_at = models.DateTimeField()  
-    created_at = models.DateTimeField(auto_now_add=True)
\ No newline at end of file
+    created_at = models.DateTimeField(auto_now_add=True)
+
+class SyncWatermark(models.Model):
+    patient = models.ForeignKey(
+        Patient,
+        on_delete=models.CASCADE,
+        related_name='sync_watermarks')
+    data_source = models.CharField(max_length=255)
+    synced_until = models.BigIntegerField()
+    state = models.JSONField(default=dict)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['patient', 'data_source'],
+                name='unique_sync_watermark_per_source'
+            )
+        ]
@@ -0,0 +1,13 @@
+from django.db.models.signals import post_delete,post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user,role_for
+from .models import Doctor,Patient
+
+
+@receiver(post_save, sender=Doctor)
+@receiver(post_save, sender=Patient)
+@receiver(post_delete, sender=Doctor)
+@receiver(post_delete, sender=Patient)
+def invalidate_cached_user(sender, instance, **kwargs):
+    invalidate_user(role_for(instance), instance.email)
@@ -1,3 +1,327 @@
-from django.test import TestCase
+from unittest import mock
 
-# Create your tests here.
+import requests
+from cachetools import TTLCache
+from django.contrib.auth.hashers import make_password
+from django.db import IntegrityError, connection, transaction
+from django.db.migrations.executor import MigrationExecutor
+from django.test import TestCase, TransactionTestCase
+from django.utils import timezone
+
+from rest_framework_simplejwt.tokens import AccessToken
+
+from HeartAI.fakes import FakeServiceAdapter
+from HeartAI.testing import QueryBudgetTestMixin
+from . import authentication
+from .authentication import RoleJWTAuthentication,clear_user_cache,invalidate_user,tokens_for
+from .models import AssignmentRequest,Doctor,Patient
+
+
+class UsersQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        password = make_password('secret')
+        cls.doctor = Doctor.objects.create(
+            first_name='Ada', last_name='Heart', full_name='Ada Heart',
+            email='ada@example.com', password=password, specialization='Cardiology'
+        )
+        cls.other_doctor = Doctor.objects.create(
+            first_name='Ben', last_name='Pulse', full_name='Ben Pulse',
+            email='ben@example.com', password=password, specialization='Cardiology'
+        )
+        cls.patients = [
+            Patient.objects.create(
+                first_name='Pat', last_name=str(i), full_name=f'Pat {i}',
+                email=f'pat{i}@example.com', password=password, doctor=cls.doctor
+            ) for i in range(5)
+        ]
+        cls.unassigned = Patient.objects.create(
+            first_name='Sam', last_name='Solo', full_name='Sam Solo',
+            email='sam@example.com', password=password
+        )
+        cls.requests = [
+            AssignmentRequest.objects.create(patient=patient, doctor=cls.other_doctor)
+            for patient in cls.patients
+        ]
+
+    def test_create_doctor(self):
+        response = self.request_within_budget('post', '/users/doctors/create/', data={
+            'first_name': 'New', 'last_name': 'Doc', 'email': 'new@example.com',
+            'specialization': 'Cardiology', 'description': '', 'password': 'pw'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_doctors_list(self):
+        response = self.request_within_budget('get', '/users/doctors/list/', **self.auth_headers(self.unassigned))
+        self.assertEqual(len(response.json()['results']), 2)
+
+    def test_list_endpoints_follow_cursors(self):
+        for path, key, user, expected in [
+            ('/users/doctors/list/', 'email', self.unassigned, [self.doctor.email, self.other_doctor.email]),
+            ('/users/patients/list/', 'email', self.doctor, sorted(patient.email for patient in self.patients)),
+            ('/users/assignment-requests/list/', 'id', self.other_doctor, [req.id for req in self.requests]),
+        ]:
+            with self.subTest(path=path):
+                self.assertEqual(self.follow_pages(f'{path}?page_size=2', key, **self.auth_headers(user)), expected)
+                response = self.client.get(f'{path}?cursor=bad!', **self.auth_headers(user))
+                self.assertEqual(response.status_code, 404)
+
+    def test_create_patient(self):
+        response = self.request_within_budget('post', '/users/patients/create/', data={
+            'first_name': 'New', 'last_name': 'Pat', 'email': 'newpat@example.com',
+            'password': 'pw', 'doctor': self.doctor.email
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_patients_list(self):
+        response = self.request_within_budget('get', '/users/patients/list/', **self.auth_headers(self.doctor))
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_remove_patient_assignment(self):
+        response = self.request_within_budget(
+            'put', f'/users/remove/?patient_email={self.patients[0].email}', **self.auth_headers(self.doctor)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_create_request(self):
+        response = self.request_within_budget('post', '/users/assignment-requests/create/', data={
+            'doctor_email': self.doctor.email
+        }, content_type='application/json', **self.auth_headers(self.unassigned))
+        self.assertEqual(response.status_code, 201)
+
+    def test_pending_requests_list(self):
+        response = self.request_within_budget(
+            'get', '/users/assignment-requests/list/', **self.auth_headers(self.other_doctor)
+        )
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_respond_request(self):
+        response = self.request_within_budget('put', '/users/assignment-requests/respond/', data={
+            'request_id': self.requests[0].id, 'action': 'accept'
+        }, content_type='application/json', **self.auth_headers(self.other_doctor))
+        self.assertEqual(response.status_code, 200)
+        self.patients[0].refresh_from_db()
+        self.assertEqual(self.patients[0].doctor_id, self.other_doctor.pk)
+
+    def test_respond_request_reject(self):
+        response = self.request_within_budget('put', '/users/assignment-requests/respond/', data={
+            'request_id': self.requests[0].id, 'action': 'reject'
+        }, content_type='application/json', **self.auth_headers(self.other_doctor))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(AssignmentRequest.objects.get(pk=self.requests[0].pk).status, 'rejected')
+        self.patients[0].refresh_from_db()
+        self.assertEqual(self.patients[0].doctor_id, self.doctor.pk)
+
+    def test_respond_request_already_processed(self):
+        AssignmentRequest.objects.filter(pk=self.requests[0].pk).update(status='rejected')
+        response = self.client.put('/users/assignment-requests/respond/', data={
+            'request_id': self.requests[0].id, 'action': 'accept'
+        }, content_type='application/json', **self.auth_headers(self.other_doctor))
+        self.assertEqual(response.status_code, 400)
+
+    def test_respond_request_rejects_non_integer_ids(self):
+        for request_id in ['abc', str(self.requests[0].id), [self.requests[0].id], 1.5, True]:
+            with self.subTest(request_id=request_id):
+                response = self.client.put('/users/assignment-requests/respond/', data={
+                    'request_id': request_id, 'action': 'accept'
+                }, content_type='application/json', **self.auth_headers(self.other_doctor))
+                self.assertEqual(response.status_code, 400)
+        self.assertEqual(AssignmentRequest.objects.get(pk=self.requests[0].pk).status, 'pending')
+
+    def test_respond_requests_bulk(self):
+        foreign = AssignmentRequest.objects.create(patient=self.unassigned, doctor=self.doctor)
+        request_ids = [req.id for req in self.requests] + [foreign.id]
+        response = self.request_within_budget('put', '/users/assignment-requests/respond/bulk/', data={
+            'request_ids': request_ids, 'action': 'accept'
+        }, content_type='application/json', **self.auth_headers(self.other_doctor))
+        self.assertEqual(response.json(), {
+            'processed': [req.id for req in self.requests], 'skipped': [foreign.id]
+        })
+        self.assertEqual(Patient.objects.filter(doctor=self.other_doctor).count(), 5)
+        self.assertEqual(AssignmentRequest.objects.get(pk=foreign.pk).status, 'pending')
+
+    def test_duplicate_pending_request_is_rejected(self):
+        response = self.client.post('/users/assignment-requests/create/', data={
+            'doctor_email': self.other_doctor.email
+        }, content_type='application/json', **self.auth_headers(self.patients[0]))
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(AssignmentRequest.objects.filter(patient=self.patients[0], status='pending').count(), 1)
+
+    def test_get_auth(self):
+        response = self.request_within_budget('get', '/users/auth/?email=pat0@example.com')
+        self.assertIn('authorization_url', response.json())
+
+    def test_callback(self):
+        with mock.patch.object(requests.Session, 'get_adapter', return_value=FakeServiceAdapter()):
+            response = self.request_within_budget('get', '/users/callback/?state=s&code=c')
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_patient_login(self):
+        response = self.request_within_budget('post', '/users/patients/login/', data={
+            'email': self.unassigned.email, 'password': 'secret'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+    def test_doctor_login(self):
+        response = self.request_within_budget('post', '/users/doctors/login/', data={
+            'email': self.doctor.email, 'password': 'secret'
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+class RoleJWTAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.doctor = Doctor.objects.create(first_name='Ada', last_name='Heart', email='ada@example.com')
+        cls.patient = Patient.objects.create(first_name='Pat', last_name='Key', email='pat@example.com')
+
+    def setUp(self):
+        # A small cache on a clock the test moves by hand.
+        self.clock = FakeClock()
+        patcher = mock.patch.object(authentication, '_users', TTLCache(maxsize=2, ttl=60, timer=self.clock))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def authenticate(self, user):
+        return RoleJWTAuthentication().get_user(tokens_for(user).access_token)
+
+    def test_cache_hit_skips_the_database(self):
+        with self.assertNumQueries(1):
+            self.authenticate(self.doctor)
+        with self.assertNumQueries(0):
+            user = self.authenticate(self.doctor)
+        self.assertIsInstance(user, Doctor)
+        self.assertEqual(user.pk, self.doctor.pk)
+        # Each request gets its own copy of the cached instance.
+        self.assertIsNot(user, self.authenticate(self.doctor))
+
+    def test_entries_expire_after_the_ttl(self):
+        self.authenticate(self.doctor)
+        self.clock.now = 59
+        with self.assertNumQueries(0):
+            self.authenticate(self.doctor)
+        self.clock.now = 61
+        with self.assertNumQueries(1):
+            self.authenticate(self.doctor)
+
+    def test_least_recently_used_entry_is_evicted(self):
+        extra = Patient.objects.create(first_name='Sam', last_name='Solo', email='sam@example.com')
+        self.authenticate(self.doctor)
+        self.authenticate(self.patient)
+        self.authenticate(extra)
+        with self.assertNumQueries(0):
+            self.authenticate(extra)
+            self.authenticate(self.patient)
+        with self.assertNumQueries(1):
+            self.authenticate(self.doctor)
+
+    def test_invalidated_users_are_reloaded(self):
+        self.authenticate(self.doctor)
+        invalidate_user('doctor', self.doctor.email)
+        with self.assertNumQueries(1):
+            self.authenticate(self.doctor)
+        clear_user_cache()
+        with self.assertNumQueries(1):
+            self.authenticate(self.doctor)
+
+    def test_token_without_a_role_claim_is_unauthorized(self):
+        token = AccessToken()
+        token['email'] = self.doctor.email
+        response = self.client.get('/users/doctors/list/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 401)
+
+    def test_token_for_a_missing_user_is_unauthorized(self):
+        token = tokens_for(self.doctor).access_token
+        Doctor.objects.filter(pk=self.doctor.pk).delete()
+        response = self.client.get('/users/doctors/list/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 401)
+
+
+class SurrogateKeyMigrationTests(TransactionTestCase):
+    # Runs the email -> bigint primary key chain (Users 0016-0017,
+    # UserVitals 0009-0010) forward, back and forward again over seeded rows.
+    email_keys = [
+        ('Users', '0015_assignmentrequest_pending_constraints'),
+        ('UserVitals', '0008_userbpm_recorded_at_and_rollups'),
+    ]
+
+    def migrate(self, targets):
+        executor = MigrationExecutor(connection)
+        executor.migrate(targets)
+        executor.loader.build_graph()
+        return executor.loader.project_state(targets).apps
+
+    def latest(self):
+        return MigrationExecutor(connection).loader.graph.leaf_nodes()
+
+    def tearDown(self):
+        self.migrate(self.latest())
+
+    def seed(self, apps):
+        Doctor = apps.get_model('Users', 'Doctor')
+        Patient = apps.get_model('Users', 'Patient')
+        now = timezone.now()
+        # Ids are handed out in email order, so the zed doctor gets id 2.
+        zed = Doctor.objects.create(email='zed@example.com', first_name='Zed', last_name='Heart')
+        Doctor.objects.create(email='ada@example.com', first_name='Ada', last_name='Heart')
+        for email in ('pat@example.com', 'sam@example.com'):
+            patient = Patient.objects.create(email=email, first_name='Pat', last_name='Key', doctor=zed)
+            apps.get_model('Users', 'AssignmentRequest').objects.create(patient=patient, doctor=zed)
+            apps.get_model('Users', 'UserCredentials').objects.create(
+                patient=patient, access_token='token', token_uri='https://oauth2.googleapis.com/token',
+                client_id='id', client_secret='secret', scopes=[], expires_at=now
+            )
+            apps.get_model('Users', 'SyncWatermark').objects.create(
+                patient=patient, data_source='steps', synced_until=0
+            )
+            apps.get_model('UserVitals', 'UserVitals').objects.create(patient=patient, steps=10)
+            apps.get_model('UserVitals', 'UserBPM').objects.create(patient=patient, heart_rate=70, recorded_at=now)
+            apps.get_model('UserVitals', 'UserBPMMinute').objects.create(patient=patient, bucket=now, count=1)
+
+    def assert_references(self, apps):
+        Patient = apps.get_model('Users', 'Patient')
+        for email in ('pat@example.com', 'sam@example.com'):
+            patient = Patient.objects.get(email=email)
+            self.assertEqual(patient.doctor.email, 'zed@example.com')
+            request = apps.get_model('Users', 'AssignmentRequest').objects.get(patient=patient)
+            self.assertEqual(request.doctor.email, 'zed@example.com')
+            for app_label, model_name in [
+                ('Users', 'UserCredentials'), ('Users', 'SyncWatermark'), ('UserVitals', 'UserVitals'),
+                ('UserVitals', 'UserBPM'), ('UserVitals', 'UserBPMMinute'),
+            ]:
+                self.assertEqual(apps.get_model(app_label, model_name).objects.get(patient=patient).patient.email, email)
+
+    def assert_surrogate_keys(self, apps):
+        self.assert_references(apps)
+        Doctor = apps.get_model('Users', 'Doctor')
+        self.assertEqual(Doctor.objects.get(email='zed@example.com').pk, Doctor.objects.count())
+        # The id sequence continues after the copied ids.
+        doctor = Doctor.objects.create(email=f'new{Doctor.objects.count()}@example.com', first_name='New', last_name='Key')
+        self.assertEqual(doctor.pk, Doctor.objects.count())
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, 'Users_assignmentrequest')
+        self.assertIn(('Users_doctor', 'id'), [
+            constraint['foreign_key'] for constraint in constraints.values() if constraint['columns'] == ['doctor_id']
+        ])
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Doctor.objects.create(email='ada@example.com', first_name='Ada', last_name='Again')
+
+    def test_forward_and_back(self):
+        self.seed(self.migrate(self.email_keys))
+        self.assert_surrogate_keys(self.migrate(self.latest()))
+
+        apps = self.migrate(self.email_keys)
+        self.assert_references(apps)
+        self.assertEqual(apps.get_model('Users', 'Doctor')._meta.pk.name, 'email')
+        self.assertEqual(apps.get_model('Users', 'Doctor').objects.count(), 3)
+
+        self.assert_surrogate_keys(self.migrate(self.latest()))
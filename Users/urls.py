@@ -14,6 +14,7 @@ urlpatterns = [
     path('assignment-requests/create/', create_request, name='create_assignment_request'),
     path('assignment-requests/list/', pending_requests_list, name='list_pending_requests'),
     path('assignment-requests/respond/', respond_request, name='respond_to_request'),
+    path('assignment-requests/respond/bulk/', respond_requests_bulk, name='bulk_respond_to_requests'),
     path('remove/', remove_patient_assignment, name='remove'),
     path('patients/list/', get_Patients_list, name='get_patients_list'), 
 
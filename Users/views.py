@@ -7,19 +7,33 @@ from rest_framework import status
 from rest_framework.decorators import api_view,permission_classes
 from rest_framework.permissions import IsAuthenticated,AllowAny
 from rest_framework.response import Response
-from rest_framework_simplejwt.tokens import RefreshToken
 
-from google_auth_oauthlib.flow import Flow
-import requests
+from HeartAI import outbound
+from HeartAI.pagination import EmailPagination,IdPagination
+from HeartAI.query_budget import query_budget
+from . import assignments
+from .authentication import tokens_for
 
 
+def build_flow():
+    # google_auth_oauthlib is only needed by the OAuth endpoints, so it is
+    # imported here rather than when the worker boots.
+    from google_auth_oauthlib.flow import Flow
+
+    return Flow.from_client_config(
+        settings.GOOGLE_CLIENT_CONFIG,
+        scopes=settings.GOOGLE_FIT_SCOPES,
+        redirect_uri=settings.GOOGLE_FIT_REDIRECT_URI
+    )
+
 def gen_JWT(user):
-    refresh = RefreshToken.for_user(user)
+    refresh = tokens_for(user)
     return{
         'access': str(refresh.access_token),
         'refresh': str(refresh)
     }
 
+@query_budget(1)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_Doctor(request):
@@ -55,20 +69,21 @@ def create_Doctor(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_Doctors_list(request):
-    try:
-        doctors = Doctor.objects.values('full_name','email','specialization','description')
-        doctors_Dict = [{"full_name": doctor['full_name'],
-                        "email":doctor['email'],
-                        "specialization":doctor['specialization'],
-                        "description":doctor['description']
-                        } for doctor in doctors]
-        return Response(doctors_Dict)
-    except Exception as e:
-        return Response({'error':str(e)})
-
+    doctors = Doctor.objects.values('full_name','email','specialization','description')
+    paginator = EmailPagination()
+    page = paginator.paginate_queryset(doctors, request)
+    doctors_Dict = [{"full_name": doctor['full_name'],
+                    "email":doctor['email'],
+                    "specialization":doctor['specialization'],
+                    "description":doctor['description']
+                    } for doctor in page]
+    return paginator.get_paginated_response(doctors_Dict)
+
+@query_budget(3)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def create_Patient(request):
@@ -117,6 +132,7 @@ def create_Patient(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_Patients_list(request):
@@ -129,10 +145,13 @@ def get_Patients_list(request):
         )
     
     patient_list = Patient.objects.filter(doctor = user).values('full_name','email')
-    patient_list = [{'full_name':patient['full_name'],'email':patient['email']} for patient in patient_list]
+    paginator = EmailPagination()
+    page = paginator.paginate_queryset(patient_list, request)
+    patient_list = [{'full_name':patient['full_name'],'email':patient['email']} for patient in page]
 
-    return Response(patient_list,status=status.HTTP_200_OK)
+    return paginator.get_paginated_response(patient_list)
 
+@query_budget(3)
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def remove_patient_assignment(request):
@@ -152,13 +171,13 @@ def remove_patient_assignment(request):
         )
     try:
         patient_targeted = get_object_or_404(Patient,email = patient_email)
-        if patient_targeted.doctor != user:
+        if patient_targeted.doctor_id != user.pk:
             return Response(
                 {"error": "You can only remove your own patients"},
                 status=status.HTTP_403_FORBIDDEN
             )
         patient_targeted.doctor = None
-        patient_targeted.save()
+        patient_targeted.save(update_fields=['doctor'])
 
         return Response(
             {
@@ -171,6 +190,7 @@ def remove_patient_assignment(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@query_budget(5)
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def create_request(request):
@@ -189,33 +209,23 @@ def create_request(request):
         )
     try:
         doctor_targeted = get_object_or_404(Doctor,email = doctor_email)
-
-        existing_request = AssignmentRequest.objects.filter(
-            patient=user,
-            doctor=doctor_targeted,
-            status='pending'
-        ).exists()
-        
-        if existing_request:
-            return Response(
-                {"error": "You already have a pending request to this doctor"},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-
-        AssignmentRequest.objects.create(
-            patient = user,
-            doctor = doctor_targeted,
-        )
+        assignments.create_request(user, doctor_targeted)
         return Response(
             {"message": "Request sent successfully."},
             status=status.HTTP_201_CREATED
         )
+    except assignments.DuplicateRequest as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     except Exception as e:
         return Response(
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
+@query_budget(2)
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def pending_requests_list(request):
@@ -227,16 +237,19 @@ def pending_requests_list(request):
     pending_list = AssignmentRequest.objects.filter(
         doctor = user,
         status = 'pending').values('id','patient__full_name','patient__email')
+    paginator = IdPagination()
+    page = paginator.paginate_queryset(pending_list, request)
     
     pending_list = [
         {
             'id':req['id'],
             'patient_name':req['patient__full_name'],
             'patient_email':req['patient__email']
-         } for req in pending_list]
+         } for req in page]
 
-    return Response(pending_list,status=status.HTTP_200_OK)
+    return paginator.get_paginated_response(pending_list)
 
+@query_budget(4)
 @api_view(['PUT'])
 @permission_classes([IsAuthenticated])
 def respond_request(request):
@@ -256,58 +269,96 @@ def respond_request(request):
             {"error": "Both 'request_id' and 'action' (accept/reject) are required."},
             status=status.HTTP_400_BAD_REQUEST
         )
+    if not isinstance(request_id, int) or isinstance(request_id, bool):
+        return Response(
+            {"error": "'request_id' must be an integer id."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
     
     try:
-        assignment_request = get_object_or_404(AssignmentRequest, id=request_id)
+        if assignments.respond(user, [request_id], action):
+            message = "Request accepted. Patient assigned to the doctor." if action == 'accept' else "Request rejected."
+            return Response(
+                {"message": message},
+                status=status.HTTP_200_OK
+            )
 
-        if assignment_request.doctor != user:
+        # Nothing was updated; work out why only on this slow path.
+        assignment_request = AssignmentRequest.objects.filter(id=request_id).values('doctor_id','status').first()
+        if assignment_request is None:
+            return Response(
+                {"error": "Request not found."},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if assignment_request['doctor_id'] != user.pk:
             return Response(
                 {'error':'User not allowed to respond to this request'},
                 status.HTTP_403_FORBIDDEN
             )
+        return Response(
+            {"error": "This request has already been processed."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    except Exception as e:
+        return Response(
+            {"error": str(e)},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
 
-        if assignment_request.status != 'pending':
-            return Response(
-                {"error": "This request has already been processed."},
-                status=status.HTTP_400_BAD_REQUEST
-            )
+@query_budget(4)
+@api_view(['PUT'])
+@permission_classes([IsAuthenticated])
+def respond_requests_bulk(request):
+    user = request.user
 
-        if action == 'accept':
-            patient = assignment_request.patient
-            patient.doctor = assignment_request.doctor
-            patient.save()
+    if not isinstance(user,Doctor):
+        return Response(
+            {'error':"Only Doctors can respond to requests"},
+            status=status.HTTP_403_FORBIDDEN
+        )
 
-            assignment_request.status = 'accepted'
-            assignment_request.save()
+    request_ids = request.data.get('request_ids')
+    action = request.data.get('action')
 
-            return Response(
-                {"message": "Request accepted. Patient assigned to the doctor."},
-                status=status.HTTP_200_OK
-            )
-        else:
-            assignment_request.status = 'rejected'
-            assignment_request.save()
+    if not isinstance(request_ids, list) or not request_ids or action not in ['accept', 'reject']:
+        return Response(
+            {"error": "A non-empty 'request_ids' list and 'action' (accept/reject) are required."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    if len(request_ids) > settings.ASSIGNMENT_RESPOND_MAX_BATCH:
+        return Response(
+            {"error": f"At most {settings.ASSIGNMENT_RESPOND_MAX_BATCH} requests can be answered per call."},
+            status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        )
+    if not all(isinstance(request_id, int) and not isinstance(request_id, bool) for request_id in request_ids):
+        return Response(
+            {"error": "'request_ids' must contain integer ids."},
+            status=status.HTTP_400_BAD_REQUEST
+        )
 
-            return Response(
-                {"message": "Request rejected."},
-                status=status.HTTP_200_OK
-            )
+    try:
+        processed = assignments.respond(user, request_ids, action)
+        processed_ids = set(processed)
+        return Response(
+            {
+                "processed": processed,
+                "skipped": [request_id for request_id in dict.fromkeys(request_ids) if request_id not in processed_ids]
+            },
+            status=status.HTTP_200_OK
+        )
     except Exception as e:
         return Response(
             {"error": str(e)},
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
     
+@query_budget(4)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_auth(request):
     user_email = request.query_params.get('email')
 
-    flow = Flow.from_client_secrets_file(
-        settings.CLIENT_SECRETS_FILE,
-        scopes=settings.GOOGLE_FIT_SCOPES,
-        redirect_uri=settings.GOOGLE_FIT_REDIRECT_URI
-    )
+    flow = build_flow()
     
     extra_params = {
         'access_type': 'offline',
@@ -323,6 +374,7 @@ def get_auth(request):
     request.session['oauth_state'] = state
     return Response({'authorization_url': authorization_url})
 
+@query_budget(10)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def callback(request):
@@ -334,16 +386,13 @@ def callback(request):
         return Response({'error': 'Invalid state parameter'}, status=400)
     
     try:
-        flow = Flow.from_client_secrets_file(
-            settings.CLIENT_SECRETS_FILE,
-            scopes=settings.GOOGLE_FIT_SCOPES,
-            redirect_uri=settings.GOOGLE_FIT_REDIRECT_URI
-        )
+        flow = build_flow()
 
         flow.fetch_token(code=authorization_code)
         credentials = flow.credentials
 
-        response = requests.get(
+        response = outbound.get(
+            'userinfo',
             'https://www.googleapis.com/oauth2/v3/userinfo',
             headers={'Authorization': f'Bearer {credentials.token}'}
         )
@@ -395,6 +444,7 @@ def callback(request):
         # Handle errors during token exchange
         return Response({'error': str(e)}, status=500)
     
+@query_budget(1)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def Patient_Login(request):
@@ -439,6 +489,7 @@ def Patient_Login(request):
         return Response({"error": "Invalid credentials"}, status.HTTP_401_UNAUTHORIZED)
     
     
+@query_budget(1)
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def Doctor_Login(request):
@@ -0,0 +1,235 @@
+# Offline API benchmarks.
+#
+#   python -m benchmarks.run [--patients 2000] [--requests 200] [--concurrency 4]
+#
+# Builds a throwaway test database, seeds it, replaces Google Fit, Google
+# OAuth/userinfo and the prediction service with in-process fakes, drives
+# every endpoint through Django's test client and prints throughput and
+# p50/p95/p99 latency per endpoint. Needs the same environment as the app
+# (DATABASE_URL, DJANGO_SECRET_KEY, GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET).
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+import django
+
+
+@dataclass
+class Scenario:
+    name: str
+    method: str
+    path: str
+    role: str = None
+    body: object = None
+    content_type: str = 'application/json'
+    settings: dict = field(default_factory=dict)
+    # Caps the request count for endpoints that are slow by design (password hashing).
+    max_requests: int = None
+
+
+def scenarios():
+    from django.utils import timezone
+
+    from benchmarks.seed import BENCH_PASSWORD,doctor_email,patient_email
+
+    def bpm_batch(i):
+        start = int(timezone.now().timestamp() * 1000) - 10 ** 9 + i * 100000
+        return [{'timestamp': start + n * 1000, 'heart_rate': 60 + n % 40} for n in range(100)]
+
+    return [
+        Scenario('users.doctors_list', 'get', '/users/doctors/list/', role='patient'),
+        Scenario('users.patients_list', 'get', '/users/patients/list/', role='doctor'),
+        Scenario('users.pending_requests', 'get', '/users/assignment-requests/list/', role='doctor'),
+        Scenario('users.doctor_login', 'post', '/users/doctors/login/',
+                 body=lambda i, ctx: {'email': doctor_email(i % ctx['doctors']), 'password': BENCH_PASSWORD},
+                 max_requests=20),
+        Scenario('users.patient_login', 'post', '/users/patients/login/',
+                 body=lambda i, ctx: {'email': patient_email(i % ctx['patients']), 'password': BENCH_PASSWORD},
+                 max_requests=20),
+        Scenario('users.oauth_callback', 'get', '/users/callback/?state=bench&code=bench'),
+        Scenario('vitals.dashboard', 'get', '/vitals/dashboard/', role='doctor'),
+        Scenario('vitals.health_data', 'get', '/vitals/health_data/', role='patient'),
+        Scenario('vitals.health_data_sync', 'get', '/vitals/health_data/?max_age=0', role='patient',
+                 settings={'VITALS_MIN_AGE': 0}),
+        Scenario('vitals.ai_pred', 'get', '/vitals/AI/', role='patient'),
+        Scenario('vitals.ai_pred_uncached', 'get', '/vitals/AI/', role='patient',
+                 settings={'AI_PRED_CACHE_TTL': 0}),
+        Scenario('vitals.bpm_export', 'get', '/vitals/bpm/export/', role='patient'),
+        Scenario('vitals.bpm_ingest', 'post', '/vitals/bpm/ingest/', role='patient',
+                 body=lambda i, ctx: bpm_batch(i)),
+        Scenario('videos.list', 'get', '/videos/video_list'),
+        Scenario('videos.get', 'get', '/videos/get_video?id={video_id}'),
+        Scenario('videos.search', 'get', '/videos/search?q=heart'),
+    ]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(scenario, ctx, requests, concurrency):
+    from django.db import connections
+    from django.test import Client, override_settings
+
+    count = min(requests, scenario.max_requests or requests)
+
+    def one(i):
+        client = Client()
+        headers = {}
+        if scenario.role:
+            tokens = ctx['tokens'][scenario.role]
+            headers['HTTP_AUTHORIZATION'] = f'Bearer {tokens[i % len(tokens)]}'
+        path = scenario.path.format(video_id=ctx['video_ids'][i % len(ctx['video_ids'])])
+        kwargs = {}
+        if scenario.body is not None:
+            kwargs['data'] = json.dumps(scenario.body(i, ctx))
+            kwargs['content_type'] = scenario.content_type
+
+        started = time.perf_counter()
+        response = getattr(client, scenario.method)(path, **kwargs, **headers)
+        if response.streaming:
+            for _ in response.streaming_content:
+                pass
+        elapsed = time.perf_counter() - started
+        return elapsed, response.status_code
+
+    def worker(indexes):
+        try:
+            return [one(i) for i in indexes]
+        finally:
+            # Worker threads hold persistent connections that would otherwise
+            # keep the test database open until the process exits.
+            connections.close_all()
+
+    with override_settings(**scenario.settings):
+        # One untimed request warms caches a deployed worker would have warm.
+        worker([count])
+        started = time.perf_counter()
+        if concurrency > 1:
+            with ThreadPoolExecutor(max_workers=concurrency) as executor:
+                chunks = [range(start, count, concurrency) for start in range(concurrency)]
+                results = [result for chunk in executor.map(worker, chunks) for result in chunk]
+        else:
+            results = worker(range(count))
+        wall = time.perf_counter() - started
+
+    latencies = sorted(elapsed for elapsed, _ in results)
+    statuses = {}
+    for _, status in results:
+        statuses[status] = statuses.get(status, 0) + 1
+
+    return {
+        'endpoint': scenario.name,
+        'requests': count,
+        'errors': sum(n for status, n in statuses.items() if status >= 400),
+        'statuses': statuses,
+        'throughput': count / wall if wall else 0.0,
+        'mean_ms': statistics.fmean(latencies) * 1000 if latencies else 0.0,
+        'p50_ms': percentile(latencies, 0.50) * 1000,
+        'p95_ms': percentile(latencies, 0.95) * 1000,
+        'p99_ms': percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_report(results, out=sys.stdout):
+    header = f"{'endpoint':<28} {'reqs':>6} {'errors':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    print(header, file=out)
+    print('-' * len(header), file=out)
+    for result in results:
+        print(
+            f"{result['endpoint']:<28} {result['requests']:>6} {result['errors']:>6} "
+            f"{result['throughput']:>9.1f} {result['p50_ms']:>9.2f} {result['p95_ms']:>9.2f} {result['p99_ms']:>9.2f}",
+            file=out
+        )
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.run', description="Offline HeartAI API benchmarks.")
+    parser.add_argument('--doctors', type=int, default=50)
+    parser.add_argument('--patients', type=int, default=2000)
+    parser.add_argument('--pending-requests', type=int, default=2, help="Pending assignment requests per doctor.")
+    parser.add_argument('--bpm', type=int, default=500, help="UserBPM rows per patient.")
+    parser.add_argument('--videos', type=int, default=200)
+    parser.add_argument('--requests', type=int, default=200, help="Timed requests per endpoint.")
+    parser.add_argument('--concurrency', type=int, default=1, help="Client threads per endpoint.")
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="Latency added to every fake remote call.")
+    parser.add_argument('--only', default='', help="Comma-separated endpoint name prefixes to run.")
+    parser.add_argument('--json', dest='json_path', help="Also write the results to this file.")
+    parser.add_argument('--keepdb', action='store_true', help="Reuse and keep the benchmark database.")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'HeartAI.settings')
+    django.setup()
+
+    from django.db import connection
+
+    from benchmarks.seed import doctor_email,patient_email,seed
+    from HeartAI import fakes
+    from Users.authentication import tokens_for
+    from Users.models import Doctor,Patient
+    from youtube_videos.models import Videos
+
+    fakes.install(latency=args.latency_ms / 1000)
+
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=0, autoclobber=True, keepdb=args.keepdb)
+    try:
+        if not Doctor.objects.exists():
+            started = time.perf_counter()
+            counts = seed(
+                doctors=args.doctors,
+                patients=args.patients,
+                pending_requests=args.pending_requests,
+                bpm_per_patient=args.bpm,
+                videos=args.videos
+            )
+            print(f"Seeded {counts} in {time.perf_counter() - started:.1f}s")
+
+        sample = min(args.patients, 100)
+        ctx = {
+            'doctors': args.doctors,
+            'patients': args.patients,
+            'tokens': {
+                'doctor': [
+                    str(tokens_for(Doctor(email = doctor_email(i))).access_token)
+                    for i in range(min(args.doctors, 100))
+                ],
+                'patient': [
+                    str(tokens_for(Patient(email = patient_email(i))).access_token)
+                    for i in range(sample)
+                ],
+            },
+            'video_ids': list(Videos.objects.values_list('id', flat=True)[:100]) or [0],
+        }
+
+        prefixes = [prefix for prefix in args.only.split(',') if prefix]
+        results = []
+        for scenario in scenarios():
+            if prefixes and not any(scenario.name.startswith(prefix) for prefix in prefixes):
+                continue
+            results.append(run_scenario(scenario, ctx, args.requests, args.concurrency))
+            print_report(results[-1:], out=sys.stderr)
+
+        print()
+        print_report(results)
+        if args.json_path:
+            with open(args.json_path, 'w') as f:
+                json.dump(results, f, indent=2)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=args.keepdb)
+
+
+if __name__ == '__main__':
+    main()
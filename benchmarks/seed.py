@@ -0,0 +1,123 @@
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+
+from Users.models import AssignmentRequest,Doctor,Patient,UserCredentials
+from UserVitals.models import UserBPM,UserVitals
+from youtube_videos.models import Videos
+
+
+BENCH_PASSWORD = 'bench-password'
+BATCH_SIZE = 5000
+
+TOPICS = [
+    'heart rate', 'blood pressure', 'cardio exercise', 'healthy diet', 'sleep',
+    'stress', 'arrhythmia', 'cholesterol', 'walking', 'oxygen saturation',
+]
+
+
+def doctor_email(index):
+    return f'doctor-{index}@bench.heartai.test'
+
+
+def patient_email(index):
+    return f'patient-{index}@bench.heartai.test'
+
+
+def seed(doctors=50, patients=2000, pending_requests=2, bpm_per_patient=500, videos=200, seed=0):
+    # Bulk-inserts a synthetic data set. Patients are spread round-robin over
+    # the doctors; each doctor also gets `pending_requests` pending
+    # assignment requests from other doctors' patients.
+    rng = random.Random(seed)
+    now = timezone.now()
+    password = make_password(BENCH_PASSWORD)
+
+    doctor_ids = [doctor.pk for doctor in Doctor.objects.bulk_create([
+        Doctor(
+            first_name = 'Doctor',
+            last_name = str(index),
+            full_name = f'Doctor {index}',
+            email = doctor_email(index),
+            password = password,
+            specialization = 'Cardiology',
+            description = 'Benchmark doctor'
+        ) for index in range(doctors)
+    ], batch_size=BATCH_SIZE)]
+
+    patient_ids = [patient.pk for patient in Patient.objects.bulk_create([
+        Patient(
+            first_name = 'Patient',
+            last_name = str(index),
+            full_name = f'Patient {index}',
+            email = patient_email(index),
+            password = password,
+            doctor_id = doctor_ids[index % doctors],
+            auth_method = 'manual'
+        ) for index in range(patients)
+    ], batch_size=BATCH_SIZE)]
+
+    assignment_requests = []
+    for doctor in range(doctors):
+        for offset in range(pending_requests):
+            patient = (doctor * pending_requests + offset + 1) % patients
+            if patient % doctors != doctor:
+                assignment_requests.append(AssignmentRequest(
+                    patient_id = patient_ids[patient],
+                    doctor_id = doctor_ids[doctor],
+                    status = 'pending'
+                ))
+    AssignmentRequest.objects.bulk_create(assignment_requests, batch_size=BATCH_SIZE)
+
+    UserCredentials.objects.bulk_create([
+        UserCredentials(
+            patient_id = patient_ids[index],
+            access_token = f'bench-access-{index}',
+            refresh_token = f'bench-refresh-{index}',
+            token_uri = 'https://oauth2.googleapis.com/token',
+            client_id = 'bench-client',
+            client_secret = 'bench-secret',
+            scopes = [],
+            expires_at = now + timedelta(days=1)
+        ) for index in range(patients)
+    ], batch_size=BATCH_SIZE)
+
+    UserVitals.objects.bulk_create([
+        UserVitals(
+            patient_id = patient_ids[index],
+            steps = rng.randint(0, 20000),
+            calories = rng.uniform(0, 3000),
+            systolic_blood_pressure = rng.uniform(105, 140),
+            diastolic_blood_pressure = rng.uniform(65, 90),
+            heart_rate = rng.uniform(55, 110),
+            oxygen_sat = rng.uniform(0.94, 0.99)
+        ) for index in range(patients)
+    ], batch_size=BATCH_SIZE)
+
+    # One reading a minute, ending now, for every patient.
+    for index in range(patients):
+        UserBPM.objects.bulk_create([
+            UserBPM(
+                patient_id = patient_ids[index],
+                heart_rate = rng.uniform(50, 120),
+                recorded_at = now - timedelta(minutes=minute)
+            ) for minute in range(bpm_per_patient)
+        ], batch_size=BATCH_SIZE)
+
+    Videos.objects.bulk_create([
+        Videos(
+            title = f'{TOPICS[index % len(TOPICS)].title()} lesson {index}',
+            mini_description = f'A short guide to {TOPICS[(index + 3) % len(TOPICS)]}',
+            description = ' '.join(rng.choice(TOPICS) for _ in range(30)),
+            link = f'https://www.youtube.com/watch?v=bench{index}'
+        ) for index in range(videos)
+    ], batch_size=BATCH_SIZE)
+
+    return {
+        'doctors': doctors,
+        'patients': patients,
+        'pending_requests': AssignmentRequest.objects.filter(status='pending').count(),
+        'bpm_rows': patients * bpm_per_patient,
+        'videos': videos,
+    }
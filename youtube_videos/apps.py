@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class YoutubeVideosConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'youtube_videos'
+
+    def ready(self):
+        from . import signals
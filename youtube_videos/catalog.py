@@ -0,0 +1,54 @@
+import hashlib
+import json
+import threading
+
+from cachetools import TTLCache
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+
+# Rendered catalog payloads keyed by request, each with a strong ETag. Entries
+# are dropped by the Videos signals in this process; the TTL bounds how long
+# other worker processes can keep serving a stale copy.
+_entries = None
+_generation = 0
+_lock = threading.Lock()
+
+
+def _cache():
+    global _entries
+    if _entries is None:
+        _entries = TTLCache(
+            maxsize=settings.VIDEO_CATALOG_CACHE_SIZE,
+            ttl=settings.VIDEO_CATALOG_CACHE_TTL
+        )
+    return _entries
+
+
+def make_etag(data):
+    payload = json.dumps(data, sort_keys=True, cls=DjangoJSONEncoder)
+    return '"%s"' % hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_or_build(key, build):
+    # Returns (data, etag). `build` runs outside the lock; its result is only
+    # stored if the catalog was not invalidated in the meantime.
+    with _lock:
+        entry = _cache().get(key)
+        generation = _generation
+    if entry is not None:
+        return entry
+
+    data = build()
+    entry = (data, make_etag(data))
+    with _lock:
+        if generation == _generation:
+            _cache()[key] = entry
+    return entry
+
+
+def invalidate(**kwargs):
+    global _generation
+    with _lock:
+        _generation += 1
+        _cache().clear()
@@ -0,0 +1,58 @@
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+def install_search_trigger(apps, schema_editor):
+    # The vector, its GIN index and the trigger that maintains them only
+    # exist on PostgreSQL; other databases fall back to icontains.
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute("""
+        CREATE FUNCTION youtube_videos_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector :=
+                setweight(to_tsvector('pg_catalog.english', coalesce(NEW.title, '')), 'A') ||
+                setweight(to_tsvector('pg_catalog.english', coalesce(NEW.mini_description, '')), 'B') ||
+                setweight(to_tsvector('pg_catalog.english', coalesce(NEW.description, '')), 'C');
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    schema_editor.execute("""
+        CREATE TRIGGER youtube_videos_search_vector_trigger
+        BEFORE INSERT OR UPDATE OF title, mini_description, description
+        ON youtube_videos_videos
+        FOR EACH ROW EXECUTE FUNCTION youtube_videos_search_vector_update()
+    """)
+    # Fires the trigger once for every existing row.
+    schema_editor.execute('UPDATE youtube_videos_videos SET title = title')
+    schema_editor.execute(
+        'CREATE INDEX youtube_videos_search_vector_gin '
+        'ON youtube_videos_videos USING GIN (search_vector)'
+    )
+
+
+def remove_search_trigger(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+
+    schema_editor.execute('DROP INDEX IF EXISTS youtube_videos_search_vector_gin')
+    schema_editor.execute('DROP TRIGGER IF EXISTS youtube_videos_search_vector_trigger ON youtube_videos_videos')
+    schema_editor.execute('DROP FUNCTION IF EXISTS youtube_videos_search_vector_update()')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('youtube_videos', '0003_videos_mini_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videos',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(install_search_trigger, remove_search_trigger),
+    ]
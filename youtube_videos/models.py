@@ -1,7 +1,10 @@
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 class Videos(models.Model):
     title = models.CharField(max_length=255)
     mini_description = models.TextField(blank=True)
     description = models.TextField(blank=True)
-    link = models.URLField(unique=True)
\ No newline at end of file
+    link = models.URLField(unique=True)
+    # Maintained by a PostgreSQL trigger (migration 0004); NULL on other databases.
+    search_vector = SearchVectorField(null=True, editable=False)
@@ -0,0 +1,11 @@
+from django.db.models.signals import post_delete,post_save
+from django.dispatch import receiver
+
+from .catalog import invalidate
+from .models import Videos
+
+
+@receiver(post_save, sender=Videos)
+@receiver(post_delete, sender=Videos)
+def invalidate_catalog(sender, **kwargs):
+    invalidate()
@@ -1,3 +1,116 @@
+from django.conf import settings
 from django.test import TestCase
 
-# Create your tests here.
+from HeartAI.testing import QueryBudgetTestMixin
+from .catalog import invalidate
+from .models import Videos
+
+
+class VideosQueryBudgetTests(QueryBudgetTestMixin, TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.videos = [
+            Videos.objects.create(
+                title=f'Heart health {i}', mini_description='Basics',
+                description='Blood pressure and heart rate', link=f'https://example.com/{i}'
+            ) for i in range(5)
+        ]
+
+    def setUp(self):
+        invalidate()
+
+    def test_videos_list(self):
+        response = self.request_within_budget('get', '/videos/video_list')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_videos_list_follows_cursors(self):
+        ids = self.follow_pages('/videos/video_list?page_size=2', 'id')
+        self.assertEqual(ids, [video.id for video in self.videos])
+        self.assertEqual(self.client.get('/videos/video_list?cursor=bad!').status_code, 404)
+
+    def test_get_video(self):
+        response = self.request_within_budget('get', f'/videos/get_video?id={self.videos[0].id}')
+        self.assertEqual(response.json()['title'], 'Heart health 0')
+
+    def test_search_videos(self):
+        response = self.request_within_budget('get', '/videos/search?q=heart')
+        self.assertEqual(len(response.json()['results']), 5)
+
+    def test_search_pages_through_equal_ranks(self):
+        # All five videos rank the same for this query, so only the id
+        # keeps pages from repeating or skipping rows.
+        ids, url = [], '/videos/search?q=pressure&page_size=2'
+        while url:
+            page = self.client.get(url).json()
+            ids += [video['id'] for video in page['results']]
+            url = page['next']
+        self.assertEqual(ids, sorted(video.id for video in self.videos))
+
+        second = self.client.get(self.client.get('/videos/search?q=pressure&page_size=2').json()['next']).json()
+        previous = self.client.get(second['previous']).json()
+        self.assertEqual([video['id'] for video in previous['results']], ids[:2])
+        self.assertIsNone(previous['previous'])
+
+    def test_search_rejects_a_bad_cursor(self):
+        response = self.client.get('/videos/search?q=heart&cursor=bm90LWpzb24=')
+        self.assertEqual(response.status_code, 404)
+
+
+class VideoCatalogCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.video = Videos.objects.create(
+            title='Heart health', mini_description='Basics',
+            description='Blood pressure and heart rate', link='https://example.com/video'
+        )
+
+    def setUp(self):
+        invalidate()
+
+    def test_responses_carry_etag_and_cache_control(self):
+        for path in ['/videos/video_list', f'/videos/get_video?id={self.video.id}']:
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertRegex(response['ETag'], r'^"[0-9a-f]{64}"$')
+                self.assertEqual(
+                    set(response['Cache-Control'].split(', ')),
+                    {'public', f'max-age={settings.VIDEO_CATALOG_MAX_AGE}'}
+                )
+
+    def test_matching_if_none_match_is_not_modified(self):
+        for path in ['/videos/video_list', f'/videos/get_video?id={self.video.id}']:
+            with self.subTest(path=path):
+                etag = self.client.get(path)['ETag']
+                # Served from the catalog cache without touching the database.
+                with self.assertNumQueries(0):
+                    response = self.client.get(path, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+
+                response = self.client.get(path, HTTP_IF_NONE_MATCH='"stale", "other"')
+                self.assertEqual(response.status_code, 200)
+
+    def test_saving_a_video_invalidates_cached_responses(self):
+        list_etag = self.client.get('/videos/video_list')['ETag']
+        detail_etag = self.client.get(f'/videos/get_video?id={self.video.id}')['ETag']
+
+        self.video.title = 'Heart rhythm'
+        self.video.save()
+
+        response = self.client.get('/videos/video_list', HTTP_IF_NONE_MATCH=list_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0]['title'], 'Heart rhythm')
+        response = self.client.get(f'/videos/get_video?id={self.video.id}', HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], 'Heart rhythm')
+
+    def test_deleting_a_video_invalidates_cached_responses(self):
+        self.client.get('/videos/video_list')
+        self.client.get(f'/videos/get_video?id={self.video.id}')
+
+        video_id = self.video.id
+        self.video.delete()
+
+        self.assertEqual(self.client.get('/videos/video_list').json()['results'], [])
+        self.assertEqual(self.client.get(f'/videos/get_video?id={video_id}').status_code, 404)
@@ -1,9 +1,10 @@
-from .views import get_video,get_videos_list
+from .views import get_video,get_videos_list,search_videos
 from django.urls import path
 
 
 urlpatterns = [
     path('video_list',get_videos_list,name = 'get_videos'),
-    path('get_video',get_video,name ='get_vid')
+    path('get_video',get_video,name ='get_vid'),
+    path('search',search_videos,name ='search_videos')
 ]
 
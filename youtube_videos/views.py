@@ -1,18 +1,36 @@
+from django.contrib.postgres.search import SearchQuery,SearchRank
 from django.core.exceptions import ValidationError
+from django.conf import settings
+from django.db import connection
+from django.db.models import Case,F,FloatField,IntegerField,Q,Value,When
+from django.db.models.functions import Cast
+from django.utils.cache import patch_cache_control
+from django.utils.http import parse_etags
 from rest_framework.decorators import api_view,permission_classes
 from rest_framework.permissions import AllowAny
 from rest_framework.response import Response
 from rest_framework import status
+from HeartAI.pagination import IdPagination,RankPagination
+from HeartAI.query_budget import query_budget
+from .catalog import get_or_build
 from .models import Videos
 
 
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_videos_list(request):
-    videos_list = Videos.objects.all().values('id','title','mini_description')
-    videos_list = list(videos_list)
-    return Response(videos_list)
+    def build():
+        videos_list = Videos.objects.all().values('id','title','mini_description')
+        paginator = IdPagination()
+        page = paginator.paginate_queryset(videos_list, request)
+        return paginator.get_paginated_response(page).data
 
+    # The next/previous links are absolute, so the host is part of the key.
+    data, etag = get_or_build(('list', request.build_absolute_uri()), build)
+    return catalog_response(request, data, etag)
+
+@query_budget(1)
 @api_view(['GET'])
 @permission_classes([AllowAny])
 def get_video(request):
@@ -24,17 +42,18 @@ def get_video(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    try:
+    def build():
         video = Videos.objects.get(id = vid_id)
-        return Response(
-            {
-                'title':video.title,
-                'description':video.description,
-                'link':video.link,
-                'mini_description':video.mini_description
-            },
-                    status=status.HTTP_200_OK
-        )
+        return {
+            'title':video.title,
+            'description':video.description,
+            'link':video.link,
+            'mini_description':video.mini_description
+        }
+
+    try:
+        data, etag = get_or_build(('video', vid_id), build)
+        return catalog_response(request, data, etag)
     except Videos.DoesNotExist:
         return Response(
             {
@@ -48,4 +67,51 @@ def get_video(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
+@query_budget(1)
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def search_videos(request):
+    query = request.query_params.get('q', '').strip()
+
+    if not query:
+        return Response(
+            {'error': 'Search query is required'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if connection.vendor == 'postgresql':
+        # Matches against the GIN-indexed search_vector; title hits weigh
+        # more than mini_description, which weigh more than description.
+        # ts_rank returns a real, which does not survive the round trip
+        # through a cursor, so it is widened to double precision.
+        search_query = SearchQuery(query, config='english', search_type='websearch')
+        videos = Videos.objects.filter(search_vector = search_query).annotate(
+            rank = Cast(SearchRank(F('search_vector'), search_query), FloatField())
+        )
+    else:
+        videos = Videos.objects.filter(
+            Q(title__icontains = query) | Q(mini_description__icontains = query) | Q(description__icontains = query)
+        ).annotate(
+            rank = Case(
+                When(title__icontains = query, then = Value(3)),
+                When(mini_description__icontains = query, then = Value(2)),
+                default = Value(1),
+                output_field = IntegerField()
+            )
+        )
+
+    paginator = RankPagination()
+    page = paginator.paginate_queryset(videos.values('id','title','mini_description','rank'), request)
+    return paginator.get_paginated_response(page)
+
+def catalog_response(request, data, etag):
+    # A matching If-None-Match gets an empty 304 so clients reuse their copy.
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and (if_none_match.strip() == '*' or etag in parse_etags(if_none_match)):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response(data, status=status.HTTP_200_OK)
 
+    response['ETag'] = etag
+    patch_cache_control(response, public=True, max_age=settings.VIDEO_CATALOG_MAX_AGE)
+    return response